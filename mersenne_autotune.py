@@ -0,0 +1,158 @@
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import time
+
+# Per-host tuning cache, one entry per hardware/software fingerprint
+TUNING_FILE = "mersenne_tuning.json"
+
+# Exponent sizes timed by the tuner; selection interpolates between them on a log scale
+SAMPLE_EXPONENTS = [127, 1279, 9689, 44497, 110503, 332203]
+
+# Target measuring time per (engine, exponent) pair
+SAMPLE_TIME = 0.05  # seconds
+
+def cpu_model():
+    """Best-effort CPU model name"""
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.lower().startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+def host_fingerprint(engine_names):
+    """Everything that can change which engine is fastest; a new value forces a re-tune"""
+    import gmpy2
+    return {
+        'cpu': cpu_model(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'gmpy2': gmpy2.version(),
+        'gmp': gmpy2.mp_version(),
+        'engines': sorted(engine_names),
+    }
+
+def fingerprint_key(fingerprint):
+    return json.dumps(fingerprint, sort_keys=True)
+
+def run_time(engine, exponent, iterations, runs):
+    """Mean seconds for one call of `engine` stopped after `iterations`"""
+    start = time.perf_counter()
+    for _ in range(runs):
+        engine(exponent, iterations=iterations)
+    return (time.perf_counter() - start) / runs
+
+def time_per_iteration(engine, exponent, sample_time=SAMPLE_TIME):
+    """
+    Steady-state seconds per LL iteration. Starting from s = 4, the first ~log2(p) iterations
+    square numbers far smaller than 2^p, and every call also pays for building 2^p - 1 and the
+    final reduction. Both costs differ between engines, so they are cancelled by timing the
+    difference between a warm-up run and a longer one; the extra iterations and repeat count
+    double until that difference fills the sample time.
+    Exponents too small to reach full size are timed over whole tests.
+    """
+    warmup = exponent.bit_length() + 2
+    if exponent - 2 <= 2 * warmup:
+        iterations = exponent - 2
+        runs = 1
+        while True:
+            elapsed = run_time(engine, exponent, iterations, runs) * runs
+            if elapsed >= sample_time:
+                return elapsed / (runs * iterations)
+            runs *= 2
+
+    extra = 4
+    runs = 1
+    while True:
+        extra = min(extra, exponent - 2 - warmup)
+        base = run_time(engine, exponent, warmup, runs)
+        total = run_time(engine, exponent, warmup + extra, runs)
+        if (total - base) * runs >= sample_time:
+            return (total - base) / extra
+        if extra < exponent - 2 - warmup:
+            extra *= 2
+        else:
+            runs *= 2
+
+def tune(engines, exponents=SAMPLE_EXPONENTS, sample_time=SAMPLE_TIME):
+    """
+    Time every engine at every sample exponent and derive crossover points:
+    a sorted list of {'min_exponent', 'engine'} ranges, each boundary placed at the
+    geometric mean of the two sample sizes where the fastest engine changes.
+    """
+    samples = []
+    for exponent in exponents:
+        timings = {name: time_per_iteration(engine, exponent, sample_time) for name, engine in engines.items()}
+        fastest = min(timings, key=timings.get)
+        samples.append({'exponent': exponent, 'fastest': fastest, 'seconds_per_iteration': timings})
+        logging.info(f"Autotune: M{exponent} fastest with {fastest} ({timings[fastest] * 1e6:.1f} us/iteration)")
+
+    crossovers = [{'min_exponent': 0, 'engine': samples[0]['fastest']}]
+    for previous, sample in zip(samples, samples[1:]):
+        if sample['fastest'] != crossovers[-1]['engine']:
+            boundary = int(math.sqrt(previous['exponent'] * sample['exponent']))
+            crossovers.append({'min_exponent': boundary, 'engine': sample['fastest']})
+    return {'tuned_at': time.time(), 'samples': samples, 'crossovers': crossovers}
+
+def load_cache(path=TUNING_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.warning(f"Could not load tuning cache {path}: {e}")
+        return {}
+
+def save_cache(cache, path=TUNING_FILE):
+    try:
+        with open(path, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except Exception as e:
+        logging.error(f"Error saving tuning cache to {path}: {e}")
+
+def load_or_tune(engines, path=TUNING_FILE, force=False):
+    """Return the cached tuning for this host, running the tuner only when the fingerprint is new"""
+    key = fingerprint_key(host_fingerprint(engines))
+    cache = load_cache(path)
+    if key in cache and not force:
+        return cache[key]
+    logging.info("No tuning for this hardware and software, measuring engines")
+    cache[key] = tune(engines)
+    save_cache(cache, path)
+    return cache[key]
+
+def select_engine(tuning, exponent, default):
+    """Fastest engine for an exponent according to the tuning crossovers"""
+    if not tuning:
+        return default
+    engine = default
+    for crossover in tuning['crossovers']:
+        if exponent >= crossover['min_exponent']:
+            engine = crossover['engine']
+    return engine
+
+def main(argv=None):
+    """Show (and optionally refresh) the tuning for this host"""
+    from mersenne_client_CPU import ENGINES
+
+    parser = argparse.ArgumentParser(description="Measure LL engines and cache the fastest per exponent size.")
+    parser.add_argument('--force', action='store_true', help="re-tune even if a cached result exists")
+    parser.add_argument('--cache', default=TUNING_FILE, help=f"tuning cache file (default {TUNING_FILE})")
+    args = parser.parse_args(argv)
+
+    tuning = load_or_tune(ENGINES, args.cache, args.force)
+    for crossover in tuning['crossovers']:
+        print(f"M{crossover['min_exponent']}+ : {crossover['engine']}")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -11,9 +11,19 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import logging
 import json
+import random
 import multiprocessing
+import signal
 from concurrent.futures import ProcessPoolExecutor
 from multiprocessing import Manager
+from multiprocessing.managers import SyncManager
+from mersenne_ledger import ExponentLedger, LEDGER_FILE
+from mersenne_stats_store import StatsStore, STATS_FILE
+from mersenne_selftest import run_self_test, format_report, STARTUP_SELF_TEST_BUDGET
+from mersenne_profiler import PhaseTimer, install_profile_handler, trigger_profile, PROFILE_WINDOW
+from mersenne_logging import configure_worker_logging
+from mersenne_autotune import load_or_tune, select_engine, TUNING_FILE
+from mersenne_energy import get_energy_source, EnergyMeter
 
 # Configure logging
 logging.basicConfig(
@@ -34,11 +44,49 @@ def create_session():
     session.mount("https://", adapter)
     return session
 
-def lucas_lehmer_test_cpu(p):
+def ignore_stop_signals():
+    """Process initializer so stop signals sent to the whole process group only
+    reach the parent, which then drains the workers"""
+    for name in ('SIGINT', 'SIGTERM', 'SIGHUP'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), signal.SIG_IGN)
+
+def lucas_lehmer_residue_shifted(p, shift, one, fold, iterations=None):
+    """
+    Lucas-Lehmer residue computed on s * 2^k mod 2^p - 1 instead of s.
+    Starting from 4 * 2^shift, squaring doubles k (mod p), so each step subtracts
+    2 * 2^k; the final value is rotated back, giving the same residue as an
+    unshifted run from different intermediate arithmetic.
+    `one` selects the integer type, `fold` the Mersenne shift-and-add reduction.
+    """
+    mersenne = (one << p) - 1
+    k = shift % p
+    s = (4 * (one << k)) % mersenne
+    for i in range(p - 2 if iterations is None else iterations):
+        k = (2 * k) % p
+        s = s * s - (one << ((k + 1) % p))
+        if fold:
+            if s < 0:
+                s += mersenne
+            s = (s & mersenne) + (s >> p)
+            if s >= mersenne:
+                s -= mersenne
+        else:
+            s = s % mersenne
+    
+    # Undo the shift: multiply by 2^(p-k), since 2^p == 1 mod 2^p - 1
+    return (s * (one << ((p - k) % p))) % mersenne
+
+def lucas_lehmer_residue_cpu(p, shift=0, iterations=None):
     """
     CPU implementation of the Lucas-Lehmer test for Mersenne numbers.
     Uses gmpy2 for arbitrary-precision arithmetic with optimizations.
+    Returns the final residue s(p-2) mod 2^p - 1.
+    `iterations` stops early, for benchmarking only.
     """
+    if shift:
+        return lucas_lehmer_residue_shifted(p, shift, gmpy2.mpz(1), fold=False, iterations=iterations)
+    
     # First check if p is prime (necessary condition for Mersenne primes)
     #Removing this check permenantly because the server will handle this
     #if not is_prime(p):
@@ -51,11 +99,89 @@ def lucas_lehmer_test_cpu(p):
     s = gmpy2.mpz(4)
     
     # For i from 1 to p-2, compute s = (s^2 - 2) mod mersenne
-    for i in range(1, p-1):
+    for i in range(p - 2 if iterations is None else iterations):
         s = (s * s - gmpy2.mpz(2)) % mersenne
         
-    # If s = 0, then 2^p - 1 is prime
-    return s == 0
+    return s
+
+def lucas_lehmer_residue_mersenne(p, shift=0, iterations=None):
+    """
+    Lucas-Lehmer residue using the Mersenne shift-and-add reduction:
+    x mod 2^p - 1 == (x & (2^p - 1)) + (x >> p), avoiding a general division.
+    """
+    if shift:
+        return lucas_lehmer_residue_shifted(p, shift, gmpy2.mpz(1), fold=True, iterations=iterations)
+    mersenne = gmpy2.mpz(2)**p - 1
+    s = gmpy2.mpz(4)
+    for i in range(p - 2 if iterations is None else iterations):
+        s = s * s - 2
+        if s < 0:
+            s += mersenne
+        s = (s & mersenne) + (s >> p)
+        if s >= mersenne:
+            s -= mersenne
+    
+    return s % mersenne
+
+def lucas_lehmer_residue_python(p, shift=0, iterations=None):
+    """Lucas-Lehmer residue with Python integers only, an independent arithmetic path"""
+    if shift:
+        return lucas_lehmer_residue_shifted(p, shift, 1, fold=True, iterations=iterations)
+    mersenne = (1 << p) - 1
+    s = 4
+    for i in range(p - 2 if iterations is None else iterations):
+        s = s * s - 2
+        if s < 0:
+            s += mersenne
+        s = (s & mersenne) + (s >> p)
+        if s >= mersenne:
+            s -= mersenne
+    
+    return s % mersenne
+
+# Available LL engines, each mapping an exponent (and optional shift) to its final residue.
+# All take (p, shift=0, iterations=None).
+ENGINES = {
+    "gmpy2": lucas_lehmer_residue_cpu,
+    "gmpy2-mersenne": lucas_lehmer_residue_mersenne,
+    "python": lucas_lehmer_residue_python,
+}
+
+# Reference engine; the client refuses work if it fails the self-test
+DEFAULT_ENGINE = "gmpy2"
+
+def ll_square(s):
+    """LL squaring step: s^2 - 2, before reduction"""
+    return s * s - 2
+
+def ll_reduce_mod(s, p, mersenne):
+    """General reduction mod 2^p - 1, as in the gmpy2 engine"""
+    return s % mersenne
+
+def ll_reduce_fold(s, p, mersenne):
+    """Mersenne shift-and-add reduction, as in the gmpy2-mersenne and python engines"""
+    if s < 0:
+        s += mersenne
+    s = (s & mersenne) + (s >> p)
+    if s >= mersenne:
+        s -= mersenne
+    return s
+
+# Each engine's loop body split into named (square, reduce) steps plus its integer type.
+# The engines keep the steps inline for speed; the profiler times these to split an iteration.
+ENGINE_STEPS = {
+    "gmpy2": (ll_square, ll_reduce_mod, gmpy2.mpz),
+    "gmpy2-mersenne": (ll_square, ll_reduce_fold, gmpy2.mpz),
+    "python": (ll_square, ll_reduce_fold, int),
+}
+
+def lucas_lehmer_test_cpu(p):
+    """Lucas-Lehmer primality test: 2^p - 1 is prime when the final residue is 0"""
+    return lucas_lehmer_residue_cpu(p) == 0
+
+def residue64(residue):
+    """Low 64 bits of an LL residue as 16 hex digits, the customary residue digest"""
+    return format(int(residue) & 0xFFFFFFFFFFFFFFFF, '016X')
 
 def is_prime(n):
     """
@@ -77,15 +203,55 @@ def is_prime(n):
             return False
     return True
 
-def worker_process(core_id, server_url, user_id, shared_state):
+def sleep_while_running(seconds, shared_state, interval=1):
+    """Sleep for up to `seconds`, returning early once the client is stopped"""
+    deadline = time.time() + seconds
+    while shared_state['running'] and time.time() < deadline:
+        time.sleep(min(interval, max(0, deadline - time.time())))
+
+def record_worker_error(shared_state, stats, core_id):
+    """Count an error in the live per-core counters and the persistent history"""
+    try:
+        shared_state['errors'][core_id] += 1
+        if stats:
+            stats.record_error(core_id)
+    except Exception as e:
+        logging.warning(f"Could not record error for core {core_id}: {e}")
+
+def count_busy_cores(shared_state):
+    return sum(1 for task in shared_state['current_tasks'].values() if task)
+
+def energy_usage(joules, exponent, engine, cores):
+    """Energy report for one completed exponent; an LL test runs p - 2 iterations"""
+    return {
+        'joules': round(joules, 3),
+        'joules_per_iteration': joules / max(1, exponent - 2),
+        'engine': engine,
+        'cores': cores,
+    }
+
+def worker_process(core_id, server_url, user_id, shared_state, ledger_path=None, stats_path=None,
+                   double_check=False, log_queue=None, energy_source="auto"):
     """Worker process function that runs independently"""
+    if log_queue is not None:
+        configure_worker_logging(log_queue)
     session = create_session()
+    ledger = ExponentLedger(ledger_path) if ledger_path else None
+    stats = StatsStore(stats_path) if stats_path else None
+    energy = get_energy_source(energy_source)
+    meter = EnergyMeter(energy, lambda: count_busy_cores(shared_state)) if energy else None
+    tuning = shared_state['tuning']
     error_count = 0
     max_errors = 700
     backoff_time = 10
     
+    # Profiling is only armed here; it samples once a request signal arrives
+    install_profile_handler(core_id, shared_state)
+    shared_state['worker_pids'][core_id] = os.getpid()
+    
     while shared_state['running']:
         try:
+            timer = PhaseTimer()
             # Fetch task
             response = session.get(
                 f"{server_url}/get_mersenne_task",
@@ -94,16 +260,51 @@ def worker_process(core_id, server_url, user_id, shared_state):
             )
             response.raise_for_status()
             task = response.json()
+            timer.mark('fetch')
             
             if task:
                 # Update task status before processing
+                task_started = time.time()
                 shared_state['current_tasks'][core_id] = task.copy()
+                timer.mark('ipc')
                 
                 exponent = task["exponent"]
                 task_id = task["task_id"]
                 
-                # Use CPU-only Lucas-Lehmer test
-                is_prime = lucas_lehmer_test_cpu(exponent)
+                # Double-checks start from a random shift so the arithmetic differs from the first test
+                shift = random.randrange(1, exponent) if double_check or task.get("double_check") else 0
+                
+                known = ledger.lookup(exponent) if ledger else None
+                resubmitted = bool(known and not shift)
+                usage = None
+                timer.mark('ledger')
+                if resubmitted:
+                    # Already tested on this host, reply without recomputing
+                    logging.info(f"M{exponent} already in ledger, resubmitting stored result")
+                    is_prime = known['is_prime']
+                    res64 = known['residue']
+                else:
+                    # Use CPU-only Lucas-Lehmer test with the fastest engine for this size
+                    engine = select_engine(tuning, exponent, DEFAULT_ENGINE)
+                    if meter:
+                        meter.start_task()
+                    started = time.time()
+                    residue = ENGINES[engine](exponent, shift)
+                    is_prime = residue == 0
+                    res64 = residue64(residue)
+                    timer.mark('compute')
+                    if meter:
+                        usage = energy_usage(meter.stop_task(), exponent, engine, len(shared_state['current_tasks']))
+                        timer.mark('energy')
+                    if known and known['residue'] != res64:
+                        logging.warning(
+                            f"Double-check of M{exponent} gave residue {res64}, "
+                            f"ledger has {known['residue']} from a previous run"
+                        )
+                    if ledger:
+                        ledger.record(exponent, is_prime, res64, time.time() - started, engine,
+                                      usage and usage['joules'], usage and usage['cores'])
+                    timer.mark('ledger')
                 
                 # Submit result
                 if is_prime:
@@ -119,7 +320,9 @@ def worker_process(core_id, server_url, user_id, shared_state):
                         "verification_method": "CPU",
                         "discovered_by": user_id,
                         "verification_status": "VERIFIED",
-                        "value_hash": str(hash(str(value)))
+                        "value_hash": str(hash(str(value))),
+                        "res64": res64,
+                        "shift": shift
                     }
                 else:
                     result = {
@@ -127,8 +330,11 @@ def worker_process(core_id, server_url, user_id, shared_state):
                         "exponent": exponent,
                         "is_prime": False,
                         "discovered_by": user_id,
-                        "verification_status": "NOT_PRIME"
+                        "verification_status": "NOT_PRIME",
+                        "res64": res64,
+                        "shift": shift
                     }
+                timer.mark('encode')
                 
                 response = session.post(
                     f"{server_url}/submit_mersenne_result",
@@ -136,6 +342,7 @@ def worker_process(core_id, server_url, user_id, shared_state):
                     timeout=30
                 )
                 response.raise_for_status()
+                timer.mark('submit')
                 
                 # Reset error count on successful task
                 error_count = 0
@@ -143,40 +350,85 @@ def worker_process(core_id, server_url, user_id, shared_state):
                 # Update completion status
                 shared_state['tasks_completed'] += 1
                 shared_state['current_tasks'][core_id] = None
+                timer.mark('ipc')
+                if stats:
+                    stats.record_task(core_id, None if resubmitted else time.time() - task_started)
+                    timer.mark('stats')
+                shared_state['last_task'][core_id] = dict(task, phases=timer.summary(), energy=usage)
                 
         except requests.exceptions.RequestException as e:
             error_count += 1
             logging.error(f"Network error in core {core_id}: {e}")
+            record_worker_error(shared_state, stats, core_id)
             if error_count >= max_errors:
                 logging.error(f"Too many errors in core {core_id}, stopping worker")
                 break
-            time.sleep(backoff_time * error_count)  # Exponential backoff
+            sleep_while_running(backoff_time * error_count, shared_state)  # Exponential backoff
         except Exception as e:
             error_count += 1
             logging.error(f"Error in core {core_id}: {e}")
+            record_worker_error(shared_state, stats, core_id)
             if error_count >= max_errors:
                 logging.error(f"Too many errors in core {core_id}, stopping worker")
                 break
-            time.sleep(backoff_time * error_count)  # Exponential backoff
+            sleep_while_running(backoff_time * error_count, shared_state)  # Exponential backoff
+    
+    if meter:
+        meter.close()
+    if ledger:
+        ledger.close()
+    if stats:
+        stats.close()
 
 class MersenneCPUClient:
-    def __init__(self, server_url, user_id, num_cores):
+    def __init__(self, server_url, user_id, num_cores, headless=False, ledger_path=LEDGER_FILE,
+                 stats_path=STATS_FILE, double_check=False, log_pipeline=None, tuning_path=TUNING_FILE,
+                 retune=False, energy_source="auto"):
         self.server_url = server_url
         self.user_id = user_id
         self.num_cores = num_cores
+        self.headless = headless
+        self.ledger_path = ledger_path
+        self.stats_path = stats_path
+        self.double_check = double_check
+        self.tuning_path = tuning_path
+        self.retune = retune
+        self.energy_source = energy_source
         self.start_time = time.time()
+        self.stop_event = threading.Event()
         
         # Use multiprocessing manager for shared state
-        self.manager = Manager()
+        if headless:
+            # Keep the manager alive through stop signals so workers can finish their task
+            self.manager = SyncManager()
+            self.manager.start(ignore_stop_signals)
+        else:
+            self.manager = Manager()
         self.shared_state = self.manager.dict()
         self.shared_state['tasks_completed'] = 0
         self.shared_state['current_tasks'] = self.manager.dict({i: None for i in range(num_cores)})
         self.shared_state['running'] = True
         self.shared_state['errors'] = self.manager.dict({i: 0 for i in range(num_cores)})
         self.shared_state['last_update'] = time.time()
+        self.shared_state['engines'] = []
+        self.shared_state['tuning'] = None
+        self.shared_state['worker_pids'] = self.manager.dict()
+        self.shared_state['last_task'] = self.manager.dict({i: None for i in range(num_cores)})
+        self.shared_state['profile_request'] = None
+        self.pending_profile = None
+        self.failed_workers = set()
+        
+        # Workers hand their log records to the caller's logging pipeline
+        self.log_queue = None
+        if log_pipeline is not None:
+            self.log_queue = self.manager.Queue()
+            log_pipeline.attach(self.log_queue)
         
         # Create process pool with context manager
-        self.process_pool = ProcessPoolExecutor(max_workers=num_cores)
+        if headless:
+            self.process_pool = ProcessPoolExecutor(max_workers=num_cores, initializer=ignore_stop_signals)
+        else:
+            self.process_pool = ProcessPoolExecutor(max_workers=num_cores)
         
     def display_progress(self):
         """Display progress information with enhanced statistics"""
@@ -197,16 +449,112 @@ class MersenneCPUClient:
         print("\nCore Status:")
         current_tasks = dict(self.shared_state['current_tasks'])
         errors = dict(self.shared_state['errors'])
+        last_tasks = dict(self.shared_state['last_task'])
         for core_id in range(self.num_cores):
             task = current_tasks.get(core_id)
             error_count = errors.get(core_id, 0)
             status = "Idle" if task is None else f"Testing M{task['exponent']}"
-            print(f"Core {core_id}: {status} (Errors: {error_count})")
+            last = last_tasks.get(core_id)
+            usage = f", last task {last['energy']['joules']:.1f} J" if last and last.get('energy') else ""
+            print(f"Core {core_id}: {status} (Errors: {error_count}{usage})")
         
         print("\nPress Ctrl+C to stop")
+        
+    def log_progress(self):
+        """Log a one-line status summary (headless replacement for display_progress)"""
+        elapsed_time = time.time() - self.start_time
+        tasks_completed = self.shared_state['tasks_completed']
+        tasks_per_hour = (tasks_completed / elapsed_time) * 3600 if elapsed_time > 0 else 0
+        current_tasks = dict(self.shared_state['current_tasks'])
+        active = [f"M{task['exponent']}" for task in current_tasks.values() if task]
+        logging.info(
+            f"Tasks completed: {tasks_completed} ({tasks_per_hour:.2f} tasks/hour), "
+            f"active: {', '.join(active) if active else 'none'}"
+        )
+        
+    def energy_summary(self):
+        """Joules per iteration and per exponent by engine and core count, from the ledger"""
+        if not self.ledger_path:
+            return []
+        ledger = ExponentLedger(self.ledger_path)
+        try:
+            return ledger.energy_summary()
+        finally:
+            ledger.close()
+        
+    def verify_engines(self, budget=STARTUP_SELF_TEST_BUDGET):
+        """Run the engine self-test; returns False if the reference engine gives wrong answers"""
+        reports = run_self_test(ENGINES, budget)
+        for name, report in reports.items():
+            level = logging.INFO if report['passed'] else logging.ERROR
+            for line in format_report({name: report}).splitlines():
+                logging.log(level, f"Self-test: {line}")
+        self.shared_state['engines'] = [name for name, report in reports.items() if report['passed']]
+        return reports[DEFAULT_ENGINE]['passed']
+        
+    def load_tuning(self):
+        """Engine crossovers for this host from the tuning cache, tuning the verified engines if needed"""
+        if not self.tuning_path:
+            return None
+        verified = {name: ENGINES[name] for name in self.shared_state['engines']}
+        try:
+            tuning = load_or_tune(verified, self.tuning_path, force=self.retune)
+            self.retune = False
+            return tuning
+        except Exception as e:
+            logging.error(f"Autotuning failed, using the {DEFAULT_ENGINE} engine for all tasks: {e}")
+            return None
+        
+    def request_profile(self, core_id, seconds=PROFILE_WINDOW):
+        """Sample the worker on `core_id` for `seconds`; returns the report path"""
+        path = trigger_profile(self.shared_state, core_id, seconds)
+        logging.info(f"Profiling core {core_id} for {seconds}s, report will be written to {path}")
+        return path
+        
+    def schedule_profile(self, core_id, seconds=PROFILE_WINDOW):
+        """Signal-safe variant of request_profile, picked up by the run loop"""
+        self.pending_profile = (core_id, seconds)
+        
+    def prepare_stores(self):
+        """Create or migrate the ledger and stats databases once, before workers open them"""
+        try:
+            for path, store in ((self.ledger_path, ExponentLedger), (self.stats_path, StatsStore)):
+                if path:
+                    store(path).close()
+        except Exception as e:
+            self.shared_state['running'] = False
+            raise RuntimeError(f"Could not open local databases, refusing to process tasks: {e}")
+        
+    def check_workers(self, futures):
+        """Report workers that have exited; returns False once none are left"""
+        for core_id, future in enumerate(futures):
+            if future.done() and core_id not in self.failed_workers:
+                self.failed_workers.add(core_id)
+                self.shared_state['current_tasks'][core_id] = None
+                error = future.exception()
+                if error is not None:
+                    logging.error(f"Worker on core {core_id} failed: {error!r}")
+                else:
+                    logging.error(f"Worker on core {core_id} exited")
+        return len(self.failed_workers) < len(futures)
+        
+    def stop(self):
+        """Request a graceful stop; safe to call from a signal handler"""
+        self.stop_event.set()
                 
     def run(self):
-        """Main processing loop with enhanced error handling"""
+        """
+        Main processing loop with enhanced error handling.
+        Raises RuntimeError if the self-test fails, the local databases cannot be opened,
+        or every worker stops.
+        """
+        # Refuse work rather than submit wrong results from broken hardware or builds
+        if not self.verify_engines():
+            self.shared_state['running'] = False
+            raise RuntimeError(f"Self-test failed for the {DEFAULT_ENGINE} engine, refusing to process tasks")
+        self.shared_state['tuning'] = self.load_tuning()
+        self.prepare_stores()
+        
         try:
             # Start a process for each core
             futures = []
@@ -216,18 +564,38 @@ class MersenneCPUClient:
                     core_id,
                     self.server_url,
                     self.user_id,
-                    self.shared_state
+                    self.shared_state,
+                    self.ledger_path,
+                    self.stats_path,
+                    self.double_check,
+                    self.log_queue,
+                    self.energy_source
                 )
                 futures.append(future)
             
             # Display progress while processes are running
-            update_interval = 2  # seconds
-            while self.shared_state['running']:
+            update_interval = 60 if self.headless else 2  # seconds
+            while self.shared_state['running'] and not self.stop_event.is_set():
+                if self.pending_profile is not None:
+                    core_id, seconds = self.pending_profile
+                    self.pending_profile = None
+                    try:
+                        self.request_profile(core_id, seconds)
+                    except (RuntimeError, ValueError) as e:
+                        logging.error(f"Could not start profile: {e}")
+                if not self.check_workers(futures):
+                    break
                 current_time = time.time()
                 if current_time - self.shared_state['last_update'] >= update_interval:
-                    self.display_progress()
+                    if self.headless:
+                        self.log_progress()
+                    else:
+                        self.display_progress()
                     self.shared_state['last_update'] = current_time
                 time.sleep(0.1)  # Reduce CPU usage
+            
+            # Let workers finish their current task and exit
+            self.shared_state['running'] = False
                 
         except KeyboardInterrupt:
             print("\nStopping client...")
@@ -241,6 +609,10 @@ class MersenneCPUClient:
         finally:
             # Ensure proper cleanup
             self.process_pool.shutdown(wait=True)
+        
+        # Losing every worker is a failure, not a clean stop, so callers can exit non-zero
+        if self.failed_workers and len(self.failed_workers) == self.num_cores:
+            raise RuntimeError("All workers have stopped, refusing to continue without any")
 
 if __name__ == "__main__":
     print("Mersenne Prime Search")
@@ -0,0 +1,198 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+import psutil
+
+from mersenne_client_CPU import MersenneCPUClient
+from mersenne_ledger import LEDGER_FILE
+from mersenne_stats_store import STATS_FILE
+from mersenne_profiler import PROFILE_WINDOW
+from mersenne_logging import setup_logging
+from mersenne_energy import parse_energy_spec
+
+DEFAULT_SERVER_URL = "http://workserverm1.curecoin.net:5005"
+
+# Config files written by the web interface and the console client
+CONFIG_FILES = ["mersenne_config.json", "client_config.json"]
+
+def load_file_config(paths):
+    """Merge settings from the existing config files, earlier files taking precedence"""
+    config = {}
+    for path in reversed(paths):
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'r') as f:
+                config.update({k: v for k, v in json.load(f).items() if v is not None})
+            logging.info(f"Configuration loaded from {path}")
+        except Exception as e:
+            logging.warning(f"Could not load config from {path}: {e}")
+    return config
+
+def auto_core_count():
+    """Pick a core count for LL work: one worker per physical core"""
+    physical = psutil.cpu_count(logical=False)
+    return physical or multiprocessing.cpu_count()
+
+def resolve_core_count(value):
+    """Turn a core setting ('auto', int or numeric string) into a valid worker count"""
+    available = multiprocessing.cpu_count()
+    if value is None or str(value).strip().lower() == 'auto':
+        return min(auto_core_count(), available)
+    cores = int(value)
+    if not 1 <= cores <= available:
+        raise ValueError(f"Invalid core count: {cores}. Must be between 1 and {available}")
+    return cores
+
+def validate_username(username):
+    """Same rules as the web login form"""
+    return (
+        username is not None
+        and 3 <= len(username) <= 20
+        and username.replace('_', '').isalnum()
+    )
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the Mersenne prime search client without a console or browser."
+    )
+    parser.add_argument('--server-url', help=f"work server URL (env MERSENNE_SERVER_URL, default {DEFAULT_SERVER_URL})")
+    parser.add_argument('--username', help="user id to credit work to (env MERSENNE_USERNAME)")
+    parser.add_argument('--cores', help="number of worker processes or 'auto' (env MERSENNE_CORES)")
+    parser.add_argument('--ledger', help=f"exponent ledger database (env MERSENNE_LEDGER, default {LEDGER_FILE})")
+    parser.add_argument('--stats', help=f"throughput history database (env MERSENNE_STATS, default {STATS_FILE})")
+    parser.add_argument('--double-check', action='store_true',
+                        help="run every test from a random shifted seed (env MERSENNE_DOUBLE_CHECK=1)")
+    parser.add_argument('--retune', action='store_true',
+                        help="re-measure the LL engines even if this host has a cached tuning")
+    parser.add_argument('--energy-source',
+                        help="energy counter: auto, rapl, fake[:watts] or none (env MERSENNE_ENERGY_SOURCE, default auto)")
+    parser.add_argument('--profile-core', type=int, default=0,
+                        help="worker sampled when the daemon receives SIGUSR2 (default 0)")
+    parser.add_argument('--profile-seconds', type=float, default=PROFILE_WINDOW,
+                        help=f"length of a SIGUSR2 profile in seconds (default {PROFILE_WINDOW})")
+    parser.add_argument('--log-file', help="also write logs to this file, rotated by size and age")
+    parser.add_argument('--log-json', action='store_true',
+                        help="write logs as JSON lines (env MERSENNE_LOG_JSON=1)")
+    parser.add_argument('--config', action='append',
+                        help="config file to read; may be repeated (default: mersenne_config.json, client_config.json)")
+    return parser.parse_args(argv)
+
+def resolve_settings(args, environ=os.environ):
+    """Combine settings with precedence: command line, environment, config files, defaults"""
+    file_config = load_file_config(args.config or CONFIG_FILES)
+
+    server_url = (
+        args.server_url
+        or environ.get('MERSENNE_SERVER_URL')
+        or file_config.get('server_url')
+        or DEFAULT_SERVER_URL
+    )
+    username = (
+        args.username
+        or environ.get('MERSENNE_USERNAME')
+        or file_config.get('username')
+        or "anonymous"
+    )
+    cores = (
+        args.cores
+        or environ.get('MERSENNE_CORES')
+        or file_config.get('cores_to_use')
+        or 'auto'
+    )
+    ledger_path = (
+        args.ledger
+        or environ.get('MERSENNE_LEDGER')
+        or file_config.get('ledger_path')
+        or LEDGER_FILE
+    )
+    stats_path = (
+        args.stats
+        or environ.get('MERSENNE_STATS')
+        or file_config.get('stats_path')
+        or STATS_FILE
+    )
+    double_check = (
+        args.double_check
+        or environ.get('MERSENNE_DOUBLE_CHECK', '').lower() in ('1', 'true', 'yes')
+        or bool(file_config.get('double_check'))
+    )
+    energy_source = (
+        args.energy_source
+        or environ.get('MERSENNE_ENERGY_SOURCE')
+        or file_config.get('energy_source')
+        or 'auto'
+    )
+    # Checked here so a bad spec fails at startup rather than inside every worker
+    parse_energy_spec(energy_source)
+    return server_url, username, resolve_core_count(cores), ledger_path, stats_path, double_check, energy_source
+
+def install_signal_handlers(client, profile_core=0, profile_seconds=PROFILE_WINDOW):
+    """First SIGINT/SIGTERM drains the workers, a second one kills them; SIGUSR2 profiles a worker"""
+    state = {'signals': 0}
+
+    def handle_signal(signum, frame):
+        state['signals'] += 1
+        if state['signals'] == 1:
+            logging.info(f"Received signal {signum}, finishing current tasks before exit (signal again to force)")
+            client.stop()
+            return
+        logging.warning(f"Received signal {signum} again, terminating workers")
+        for child in psutil.Process().children(recursive=True):
+            try:
+                child.kill()
+            except psutil.NoSuchProcess:
+                pass
+        os._exit(1)
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, handle_signal)
+    if hasattr(signal, 'SIGUSR2'):
+        signal.signal(signal.SIGUSR2, lambda signum, frame: client.schedule_profile(profile_core, profile_seconds))
+
+def main(argv=None):
+    """Headless entry point: configure from flags/env/config files and start computing"""
+    args = parse_args(argv)
+    log_pipeline = setup_logging(
+        log_files=[(args.log_file, logging.INFO)] if args.log_file else [],
+        json_format=args.log_json or None
+    )
+    try:
+        (server_url, username, num_cores, ledger_path, stats_path,
+         double_check, energy_source) = resolve_settings(args)
+    except ValueError as e:
+        logging.error(str(e))
+        return 2
+
+    if not validate_username(username) and username != "anonymous":
+        logging.error(f"Invalid username '{username}': use 3-20 letters, numbers or underscores")
+        return 2
+
+    logging.info(f"Starting headless client as {username} on {num_cores} cores against {server_url}")
+    client = MersenneCPUClient(server_url, username, num_cores, headless=True,
+                               ledger_path=ledger_path, stats_path=stats_path, double_check=double_check,
+                               log_pipeline=log_pipeline, retune=args.retune, energy_source=energy_source)
+    install_signal_handlers(client, args.profile_core, args.profile_seconds)
+    try:
+        client.run()
+    except RuntimeError as e:
+        logging.error(str(e))
+        return 1
+    logging.info(f"Stopped after completing {client.shared_state['tasks_completed']} tasks")
+    for entry in client.energy_summary():
+        logging.info(
+            f"Energy: {entry['engine']} on {entry['cores']} cores, {entry['tasks']} tasks, "
+            f"{entry['joules_per_exponent']:.1f} J/exponent, {entry['joules_per_iteration'] * 1e3:.3f} mJ/iteration"
+        )
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
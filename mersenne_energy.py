@@ -0,0 +1,168 @@
+import os
+import glob
+import time
+import logging
+import threading
+
+# Linux powercap sysfs tree exposing RAPL energy counters
+POWERCAP_ROOT = "/sys/class/powercap"
+
+# Seconds between counter samples while a worker runs; far shorter than a RAPL counter wrap
+ENERGY_SAMPLE_INTERVAL = 10
+
+class RaplEnergySource:
+    """
+    Cumulative package energy from the RAPL powercap counters, summed over all CPU packages.
+    Counters wrap at max_energy_range_uj; one wrap between reads is corrected, so reads
+    must be closer together than a wrap period (tens of minutes at full load). EnergyMeter
+    takes care of that.
+    """
+    name = "rapl"
+
+    def __init__(self, root=POWERCAP_ROOT):
+        # Top-level package domains only (intel-rapl:0), not their core/dram subzones (intel-rapl:0:0)
+        self.domains = []
+        for path in sorted(glob.glob(os.path.join(root, "intel-rapl:*"))):
+            if os.path.basename(path).count(':') != 1:
+                continue
+            try:
+                with open(os.path.join(path, "max_energy_range_uj"), 'r') as f:
+                    max_range = int(f.read())
+                self.domains.append({'path': os.path.join(path, "energy_uj"), 'max_range': max_range,
+                                     'last': self._read_raw(os.path.join(path, "energy_uj")), 'total': 0})
+            except (OSError, ValueError) as e:
+                logging.debug(f"Skipping RAPL domain {path}: {e}")
+
+    @staticmethod
+    def _read_raw(path):
+        with open(path, 'r') as f:
+            return int(f.read())
+
+    @property
+    def available(self):
+        return bool(self.domains)
+
+    def read(self):
+        """Joules consumed since this source was created"""
+        total = 0
+        for domain in self.domains:
+            raw = self._read_raw(domain['path'])
+            delta = raw - domain['last']
+            if delta < 0:
+                delta += domain['max_range']
+            domain['total'] += delta
+            domain['last'] = raw
+            total += domain['total']
+        return total / 1e6
+
+class FakeEnergySource:
+    """Constant power draw, for tests and hosts without RAPL"""
+    name = "fake"
+    available = True
+
+    def __init__(self, watts=50.0, clock=time.monotonic):
+        self.watts = watts
+        self.clock = clock
+        self.start = clock()
+
+    def read(self):
+        return (self.clock() - self.start) * self.watts
+
+def parse_energy_spec(spec):
+    """
+    Split an energy source spec into (kind, watts): "auto" or "rapl" for RAPL counters,
+    "fake" or "fake:<watts>" for a constant draw, "none" to disable.
+    Raises ValueError for anything else.
+    """
+    spec = (spec or "none").strip().lower()
+    kind, _, watts = spec.partition(':')
+    if kind == "fake":
+        try:
+            watts = float(watts) if watts else 50.0
+        except ValueError:
+            raise ValueError(f"Invalid energy source '{spec}': fake needs a wattage, e.g. fake:65")
+        if watts < 0:
+            raise ValueError(f"Invalid energy source '{spec}': wattage cannot be negative")
+        return kind, watts
+    if kind in ("auto", "rapl", "none") and not watts:
+        return kind, None
+    raise ValueError(f"Invalid energy source '{spec}': use auto, rapl, fake[:watts] or none")
+
+def get_energy_source(spec="auto"):
+    """
+    Build an energy source from a spec (see parse_energy_spec).
+    Returns None when no usable source exists.
+    """
+    kind, watts = parse_energy_spec(spec)
+    if kind == "none":
+        return None
+    if kind == "fake":
+        return FakeEnergySource(watts)
+    try:
+        source = RaplEnergySource()
+    except OSError as e:
+        logging.debug(f"RAPL counters unreadable: {e}")
+        return None
+    if not source.available:
+        if kind == "rapl":
+            logging.warning("RAPL energy counters are not available or not readable on this host")
+        return None
+    return source
+
+def attribute_energy(joules, busy_cores):
+    """
+    Share of package energy charged to one task. RAPL measures the whole package,
+    so energy is split evenly across the cores that were busy.
+    """
+    return joules / max(1, busy_cores)
+
+class EnergyMeter:
+    """
+    Samples an energy source on a background thread every `interval` seconds, so counter wraps
+    are caught however long a task runs. The energy of each interval is charged to the task
+    being measured, divided by the busy-core count (`busy_cores()`) sampled at that moment.
+    """
+    def __init__(self, source, busy_cores, interval=ENERGY_SAMPLE_INTERVAL):
+        self.source = source
+        self.busy_cores = busy_cores
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last = source.read()
+        self.task_joules = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        with self.lock:
+            # Occupancy first, so a failed lookup leaves the interval to the next sample
+            busy = self.busy_cores() if self.task_joules is not None else 1
+            reading = self.source.read()
+            joules = reading - self.last
+            self.last = reading
+            if self.task_joules is not None:
+                self.task_joules += attribute_energy(joules, busy)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logging.debug(f"Energy sample failed: {e}")
+
+    def start_task(self):
+        """Start charging energy to a new task; anything consumed before now is dropped"""
+        self.sample()
+        with self.lock:
+            self.task_joules = 0.0
+
+    def stop_task(self):
+        """Joules charged to the task since start_task()"""
+        self.sample()
+        with self.lock:
+            joules, self.task_joules = self.task_joules, None
+        return joules
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
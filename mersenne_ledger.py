@@ -0,0 +1,184 @@
+import argparse
+import sqlite3
+import sys
+import time
+import logging
+
+# Default location of the per-host exponent ledger
+LEDGER_FILE = "mersenne_ledger.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    exponent INTEGER PRIMARY KEY,
+    is_prime INTEGER NOT NULL,
+    residue TEXT,
+    duration REAL,
+    engine TEXT,
+    tested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS timings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    exponent INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    engine TEXT,
+    recorded_at REAL NOT NULL,
+    energy REAL,
+    cores INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_timings_exponent ON timings (exponent);
+"""
+
+# Columns added after the first release, created on ledgers that predate them
+MIGRATIONS = {
+    'timings': [("energy", "REAL"), ("cores", "INTEGER")],
+}
+
+class ExponentLedger:
+    """
+    SQLite record of every exponent this host has tested.
+    Each worker process opens its own connection; WAL mode lets them write concurrently.
+    """
+    def __init__(self, path=LEDGER_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.migrate()
+
+    def missing_columns(self):
+        missing = []
+        for table, columns in MIGRATIONS.items():
+            existing = {row['name'] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            missing.extend((table, name, kind) for name, kind in columns if name not in existing)
+        return missing
+
+    def migrate(self):
+        """
+        Add columns missing from older ledgers. Up-to-date ledgers are only read, so readers
+        never take the write lock; otherwise the columns are re-checked under BEGIN IMMEDIATE,
+        so processes opening an old ledger together take turns.
+        """
+        if not self.missing_columns():
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table, name, kind in self.missing_columns():
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def lookup(self, exponent):
+        """Return the stored result for an exponent, or None if it has not been tested"""
+        row = self.conn.execute(
+            "SELECT exponent, is_prime, residue, duration, engine, tested_at FROM results WHERE exponent = ?",
+            (exponent,)
+        ).fetchone()
+        if row is None:
+            return None
+        result = dict(row)
+        result['is_prime'] = bool(result['is_prime'])
+        return result
+
+    def record(self, exponent, is_prime, residue, duration, engine, energy=None, cores=None):
+        """
+        Store a completed test and append its timing to the history.
+        `energy` is the joules attributed to the task, `cores` the worker count it ran alongside.
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (exponent, is_prime, residue, duration, engine, tested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (exponent, int(is_prime), residue, duration, engine, now)
+            )
+            self.conn.execute(
+                "INSERT INTO timings (exponent, duration, engine, recorded_at, energy, cores) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (exponent, duration, engine, now, energy, cores)
+            )
+
+    def timing_history(self, exponent=None, limit=100):
+        """Most recent timings, optionally for a single exponent"""
+        if exponent is None:
+            rows = self.conn.execute(
+                "SELECT exponent, duration, engine, recorded_at, energy, cores FROM timings ORDER BY id DESC LIMIT ?",
+                (limit,)
+            )
+        else:
+            rows = self.conn.execute(
+                "SELECT exponent, duration, engine, recorded_at, energy, cores FROM timings WHERE exponent = ? "
+                "ORDER BY id DESC LIMIT ?",
+                (exponent, limit)
+            )
+        return [dict(row) for row in rows]
+
+    def estimate_duration(self, exponent):
+        """
+        Estimate how long an exponent will take from the closest recorded timing.
+        LL cost grows roughly with p^2, so the nearest sample is scaled accordingly.
+        """
+        row = self.conn.execute(
+            "SELECT exponent, duration FROM timings ORDER BY ABS(exponent - ?) LIMIT 1",
+            (exponent,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row['duration'] * (exponent / row['exponent']) ** 2
+
+    def energy_summary(self, since=None):
+        """
+        Energy efficiency per (engine, core count) over tasks with an energy reading:
+        joules per LL iteration (p - 2 per exponent) and per completed exponent.
+        """
+        rows = self.conn.execute(
+            "SELECT engine, cores, COUNT(*) AS tasks, SUM(energy) AS joules, "
+            "SUM(exponent - 2) AS iterations, SUM(duration) AS duration "
+            "FROM timings WHERE energy IS NOT NULL AND recorded_at >= ? "
+            "GROUP BY engine, cores ORDER BY engine, cores",
+            (since or 0,)
+        )
+        summary = []
+        for row in rows:
+            entry = dict(row)
+            entry['joules_per_iteration'] = entry['joules'] / entry['iterations'] if entry['iterations'] else None
+            entry['joules_per_exponent'] = entry['joules'] / entry['tasks']
+            summary.append(entry)
+        return summary
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception as e:
+            logging.warning(f"Error closing ledger {self.path}: {e}")
+
+def main(argv=None):
+    """Show recent timings and duration estimates for capacity planning"""
+    parser = argparse.ArgumentParser(description="Inspect the exponent ledger's timing history.")
+    parser.add_argument('--db', default=LEDGER_FILE, help=f"ledger database (default {LEDGER_FILE})")
+    parser.add_argument('--exponent', type=int, help="only show timings for this exponent")
+    parser.add_argument('--limit', type=int, default=20, help="number of timings to show (default 20)")
+    parser.add_argument('--estimate', type=int, action='append', default=[],
+                        help="estimate the duration of this exponent; may be repeated")
+    args = parser.parse_args(argv)
+
+    ledger = ExponentLedger(args.db)
+    try:
+        for timing in ledger.timing_history(args.exponent, args.limit):
+            tested = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timing['recorded_at']))
+            print(f"{tested}  M{timing['exponent']}  {timing['duration']:.3f}s  {timing['engine'] or '-'}")
+        for exponent in args.estimate:
+            estimate = ledger.estimate_duration(exponent)
+            if estimate is None:
+                print(f"M{exponent}: no timings recorded yet")
+            else:
+                print(f"M{exponent}: about {estimate:.1f}s")
+    finally:
+        ledger.close()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
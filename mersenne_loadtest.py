@@ -0,0 +1,128 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from mersenne_client_CPU import MersenneCPUClient
+from mersenne_mock_server import MockWorkServer, parse_range
+from mersenne_relay import TaskRelay
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+def recovery_times(server, window_start):
+    """Seconds from the end of each outage until the server next handed out or accepted work"""
+    times = []
+    successes = sorted(t for t, kind, ok in server.events if ok and kind in ('fetch', 'submit'))
+    for start, end in server.config['outages']:
+        outage_end = server.start_time + end
+        if outage_end < window_start:
+            continue
+        after = [t for t in successes if t >= outage_end]
+        times.append(round(after[0] - outage_end, 2) if after else None)
+    return times
+
+def run_load_test(duration, num_cores, sample_interval=0.5, ledger_path=None, relay_path=None,
+                  energy_source="none", tuning_path=None, **server_config):
+    """
+    Run the real client against a mock server for `duration` seconds of work and return
+    tasks/hour, the fraction of core-time spent without a task and outage recovery times.
+    With `relay_path`, the client talks to a TaskRelay (state in that file) in front of the server.
+    With a ledger and an `energy_source`, the report includes joules per iteration and per exponent.
+    Engines are only tuned when a `tuning_path` is given; otherwise every task uses the default engine.
+    """
+    server = MockWorkServer(**server_config).start()
+    relay = None
+    if relay_path:
+        relay = TaskRelay(server.url, "loadtest-relay", relay_path, port=0, poll_interval=0.5).start()
+    client = MersenneCPUClient(relay.url if relay else server.url, "loadtest", num_cores, headless=True,
+                               ledger_path=ledger_path, stats_path=None, energy_source=energy_source,
+                               tuning_path=tuning_path)
+    runner = threading.Thread(target=client.run, daemon=True)
+    runner.start()
+
+    # The window starts once workers are running, after the client's startup self-test
+    while not dict(client.shared_state['worker_pids']) and runner.is_alive():
+        time.sleep(0.05)
+    window_start = time.time()
+    # Outages are scheduled relative to the start of the measured window
+    server.start_time = window_start
+
+    idle_samples = 0
+    samples = 0
+    while time.time() - window_start < duration and runner.is_alive():
+        current_tasks = dict(client.shared_state['current_tasks'])
+        idle_samples += sum(1 for task in current_tasks.values() if task is None)
+        samples += len(current_tasks)
+        time.sleep(sample_interval)
+    elapsed = time.time() - window_start
+
+    with server.lock:
+        completed = sum(1 for r in server.results if r['received_at'] - window_start <= elapsed)
+        failed_requests = sum(1 for t, kind, ok in server.events if not ok)
+    client.stop()
+    runner.join()
+    if relay:
+        relay.stop()
+    server.stop()
+
+    return {
+        'duration': round(elapsed, 2),
+        'cores': num_cores,
+        'tasks_completed': completed,
+        'tasks_per_hour': round(completed / elapsed * 3600, 2) if elapsed > 0 else 0,
+        'idle_fraction': round(idle_samples / samples, 3) if samples else None,
+        'failed_requests': failed_requests,
+        'recovery_times': recovery_times(server, window_start),
+        'relay': relay is not None,
+        'energy': client.energy_summary(),
+    }
+
+def main(argv=None):
+    """Run the load test from the command line and print the report as JSON"""
+    parser = argparse.ArgumentParser(description="Measure the client against a local mock work server.")
+    parser.add_argument('--duration', type=float, default=60, help="measured seconds (default 60)")
+    parser.add_argument('--cores', type=int, default=1)
+    parser.add_argument('--latency', type=parse_range, default=(0.0, 0.0), help="min:max seconds per request")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--empty-rate', type=float, default=0.0)
+    parser.add_argument('--duplicate-rate', type=float, default=0.0)
+    parser.add_argument('--outage', type=parse_range, action='append', default=[],
+                        help="start:end seconds into the run; may be repeated")
+    parser.add_argument('--exponents', type=parse_range, default=(500, 3000), help="min:max exponent range")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--ledger', action='store_true', help="use a fresh exponent ledger during the run")
+    parser.add_argument('--relay', action='store_true', help="route the client through a local TaskRelay")
+    parser.add_argument('--energy-source', default="none",
+                        help="energy counter for the client: auto, rapl, fake[:watts] or none (needs --ledger)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_load_test(
+            args.duration, args.cores,
+            ledger_path=os.path.join(tmp, "loadtest_ledger.db") if args.ledger else None,
+            relay_path=os.path.join(tmp, "loadtest_relay.db") if args.relay else None,
+            energy_source=args.energy_source,
+            tuning_path=os.path.join(tmp, "loadtest_tuning.json"),
+            latency=args.latency,
+            error_rate=args.error_rate,
+            empty_rate=args.empty_rate,
+            duplicate_rate=args.duplicate_rate,
+            outages=args.outage,
+            exponent_range=tuple(int(x) for x in args.exponents),
+            seed=args.seed,
+        )
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Rotation defaults for every log file
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_ROTATE_INTERVAL = 24 * 3600  # seconds
+
+# Identical warnings or errors repeated inside this window are collapsed into one line
+RATE_LIMIT_WINDOW = 60  # seconds
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """Rotates when the file exceeds maxBytes or when `interval` seconds have passed"""
+    def __init__(self, filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                 interval=LOG_ROTATE_INTERVAL, encoding=None):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding)
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drop WARNING and above records whose message was already seen within `window` seconds.
+    The next record let through for that message notes how many were suppressed.
+    """
+    def __init__(self, window=RATE_LIMIT_WINDOW):
+        super().__init__()
+        self.window = window
+        self.lock = threading.Lock()
+        self.seen = {}
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.time()
+        with self.lock:
+            last, suppressed = self.seen.get(key, (0, 0))
+            if now - last < self.window:
+                self.seen[key] = (last, suppressed + 1)
+                return False
+            self.seen[key] = (now, 0)
+            if len(self.seen) > 10000:
+                self.seen = {k: v for k, v in self.seen.items() if now - v[0] < self.window}
+        if suppressed:
+            record.msg = f"{record.getMessage()} (repeated {suppressed} more times)"
+            record.args = None
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for log shippers"""
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.processName,
+            'function': record.funcName,
+            'line': record.lineno,
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+class RateLimitedQueueListener(QueueListener):
+    """QueueListener that applies one shared RateLimitFilter before dispatching to its handlers"""
+    def __init__(self, queue, handlers, rate_filter=None):
+        super().__init__(queue, *handlers, respect_handler_level=True)
+        self.rate_filter = rate_filter
+
+    def handle(self, record):
+        if self.rate_filter is None or self.rate_filter.filter(record):
+            super().handle(record)
+
+class LogPipeline:
+    """
+    Routes every record through a queue to a background listener that owns the
+    console and file handlers, so logging never blocks the caller on I/O.
+    Worker processes get a multiprocessing queue feeding the same handlers.
+    """
+    def __init__(self, handlers, rate_filter=None):
+        self.handlers = handlers
+        self.rate_filter = rate_filter
+        self.queue = queue.SimpleQueue()
+        self.listeners = [RateLimitedQueueListener(self.queue, handlers, rate_filter)]
+        self.listeners[0].start()
+
+    def attach(self, log_queue):
+        """Start draining a queue filled by other processes (see configure_worker_logging)"""
+        listener = RateLimitedQueueListener(log_queue, self.handlers, self.rate_filter)
+        listener.start()
+        self.listeners.append(listener)
+        return listener
+
+    def detach(self, listener):
+        if listener in self.listeners:
+            listener.stop()
+            self.listeners.remove(listener)
+
+    def stop(self):
+        for listener in reversed(self.listeners):
+            try:
+                listener.stop()
+            except Exception:
+                pass
+        self.listeners = []
+
+def setup_logging(log_files=(), level=logging.INFO, console_level=logging.INFO, fmt=LOG_FORMAT,
+                  json_format=None, rate_limit=RATE_LIMIT_WINDOW):
+    """
+    Replace the root logger's handlers with a queue feeding a LogPipeline.
+    `log_files` is a sequence of (path, level) or (path, level, logger name) tuples;
+    a logger name restricts that file to records from that logger.
+    JSON output is enabled by `json_format` or the MERSENNE_LOG_JSON environment variable.
+    """
+    if json_format is None:
+        json_format = os.environ.get('MERSENNE_LOG_JSON', '').lower() in ('1', 'true', 'yes')
+    formatter = JsonFormatter() if json_format else logging.Formatter(fmt)
+    rate_filter = RateLimitFilter(rate_limit) if rate_limit else None
+
+    handlers = []
+    console = logging.StreamHandler()
+    console.setLevel(console_level)
+    handlers.append(console)
+    for entry in log_files:
+        path, file_level = entry[0], entry[1]
+        handler = SizeAndTimeRotatingFileHandler(path)
+        handler.setLevel(file_level)
+        if len(entry) > 2 and entry[2]:
+            handler.addFilter(logging.Filter(entry[2]))
+        handlers.append(handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    pipeline = LogPipeline(handlers, rate_filter)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(pipeline.queue))
+    root.setLevel(level)
+    atexit.register(pipeline.stop)
+    return pipeline
+
+def configure_worker_logging(log_queue, level=logging.INFO):
+    """Send this process's records to the parent's pipeline instead of writing them here"""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
@@ -0,0 +1,190 @@
+import argparse
+import logging
+import random
+import threading
+import time
+
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+from mersenne_client_CPU import is_prime
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Suppress Flask request logging
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+DEFAULT_MOCK_CONFIG = {
+    'latency': (0.0, 0.0),          # seconds added to every request, uniform between min and max
+    'error_rate': 0.0,              # fraction of requests answered with HTTP 500
+    'empty_rate': 0.0,              # fraction of task requests answered with no task
+    'duplicate_rate': 0.0,          # fraction of tasks that re-issue an already issued exponent
+    'outages': [],                  # (start, end) seconds after startup during which every request fails
+    'exponent_range': (500, 3000),  # prime exponents are drawn uniformly from this range
+    'exponents': None,              # explicit list of exponents, handed out in order, overrides the range
+    'seed': None,
+}
+
+class MockWorkServer:
+    """
+    Local stand-in for the work server implementing /get_mersenne_task,
+    /submit_mersenne_result and /public_stats with injectable faults.
+    Every request is recorded so a harness can measure client behaviour.
+    """
+    def __init__(self, host='127.0.0.1', port=0, **config):
+        self.config = dict(DEFAULT_MOCK_CONFIG)
+        self.config.update(config)
+        self.random = random.Random(self.config['seed'])
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.next_task_id = 1
+        self.issued = {}
+        self.results = []
+        self.events = []
+
+        lo, hi = self.config['exponent_range']
+        self.exponent_pool = [p for p in range(lo, hi + 1) if is_prime(p)]
+        self.exponent_queue = list(self.config['exponents'] or [])
+
+        self.app = self.create_app()
+        self.server = make_server(host, port, self.app, threaded=True)
+        self.host = host
+        self.port = self.server.server_port
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def in_outage(self, now=None):
+        elapsed = (now or time.time()) - self.start_time
+        return any(start <= elapsed < end for start, end in self.config['outages'])
+
+    def record(self, kind, ok):
+        with self.lock:
+            self.events.append((time.time(), kind, ok))
+
+    def inject_faults(self, kind):
+        """Apply latency, outages and random errors; returns an error response or None"""
+        lo, hi = self.config['latency']
+        if hi > 0:
+            time.sleep(self.random.uniform(lo, hi))
+        if self.in_outage():
+            self.record(kind, False)
+            return jsonify({"error": "Service unavailable (simulated outage)"}), 503
+        if self.random.random() < self.config['error_rate']:
+            self.record(kind, False)
+            return jsonify({"error": "Internal server error (simulated)"}), 500
+        return None
+
+    def next_exponent(self):
+        if self.issued and self.random.random() < self.config['duplicate_rate']:
+            return self.random.choice(list(self.issued.values()))
+        if self.config['exponents'] is not None:
+            return self.exponent_queue.pop(0) if self.exponent_queue else None
+        return self.random.choice(self.exponent_pool)
+
+    def create_app(self):
+        app = Flask(__name__)
+
+        @app.route('/get_mersenne_task')
+        def get_mersenne_task():
+            error = self.inject_faults('fetch')
+            if error:
+                return error
+            with self.lock:
+                exponent = None
+                if self.random.random() >= self.config['empty_rate']:
+                    exponent = self.next_exponent()
+                if exponent is None:
+                    self.events.append((time.time(), 'fetch', True))
+                    return jsonify(None)
+                task = {"task_id": self.next_task_id, "exponent": exponent}
+                self.issued[self.next_task_id] = exponent
+                self.next_task_id += 1
+                self.events.append((time.time(), 'fetch', True))
+            return jsonify(task)
+
+        @app.route('/submit_mersenne_result', methods=['POST'])
+        def submit_mersenne_result():
+            error = self.inject_faults('submit')
+            if error:
+                return error
+            result = request.get_json(silent=True) or {}
+            if result.get('task_id') not in self.issued:
+                self.record('submit', False)
+                return jsonify({"error": "Unknown task"}), 400
+            with self.lock:
+                self.results.append(dict(result, received_at=time.time()))
+                self.events.append((time.time(), 'submit', True))
+            return jsonify({"status": "accepted"})
+
+        @app.route('/public_stats')
+        def public_stats():
+            error = self.inject_faults('stats')
+            if error:
+                return error
+            self.record('stats', True)
+            with self.lock:
+                return jsonify({
+                    "tasks_issued": len(self.issued),
+                    "results_received": len(self.results),
+                    "primes_found": sum(1 for r in self.results if r.get('is_prime')),
+                })
+
+        return app
+
+    def start(self):
+        """Serve in a background thread"""
+        self.start_time = time.time()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logging.info(f"Mock work server listening on {self.url}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        if self.thread:
+            self.thread.join()
+
+def parse_range(value):
+    lo, hi = value.split(':')
+    return float(lo), float(hi)
+
+def main(argv=None):
+    """Run the mock work server in the foreground"""
+    parser = argparse.ArgumentParser(description="Local stand-in for the Mersenne work server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5005)
+    parser.add_argument('--latency', type=parse_range, default=(0.0, 0.0), help="min:max seconds per request")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--empty-rate', type=float, default=0.0)
+    parser.add_argument('--duplicate-rate', type=float, default=0.0)
+    parser.add_argument('--outage', type=parse_range, action='append', default=[],
+                        help="start:end seconds after startup; may be repeated")
+    parser.add_argument('--exponents', type=parse_range, default=(500, 3000), help="min:max exponent range")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    server = MockWorkServer(
+        args.host, args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        empty_rate=args.empty_rate,
+        duplicate_rate=args.duplicate_rate,
+        outages=args.outage,
+        exponent_range=tuple(int(x) for x in args.exponents),
+        seed=args.seed,
+    )
+    logging.info(f"Mock work server listening on {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
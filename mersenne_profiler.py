@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import logging
+import threading
+from collections import Counter
+
+# Where sampled stack reports are written
+PROFILE_DIR = "mersenne_profiles"
+
+# Default sampling window and interval for an on-demand profile
+PROFILE_WINDOW = 30  # seconds
+PROFILE_INTERVAL = 0.005  # seconds between samples
+
+# Signal that asks a worker process to sample itself (not available on Windows)
+PROFILE_SIGNAL = getattr(signal, 'SIGUSR1', None)
+
+# Time spent measuring the square/reduce split after a stack profile
+STEP_PROFILE_BUDGET = 2.0  # seconds
+
+class PhaseTimer:
+    """Lap timer: each mark() charges the time since the previous mark to a phase"""
+    def __init__(self):
+        self.phases = {}
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def summary(self):
+        return {phase: round(seconds, 6) for phase, seconds in self.phases.items()}
+
+def profiling_supported():
+    return PROFILE_SIGNAL is not None
+
+def profile_report_path(core_id):
+    return os.path.join(PROFILE_DIR, f"core{core_id}-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+
+def step_report_path(path):
+    return os.path.splitext(path)[0] + ".steps.json"
+
+def list_profile_reports():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted(os.listdir(PROFILE_DIR), reverse=True)
+
+def sample_stacks(thread_id, seconds, interval, path):
+    """
+    Sample the stack of one thread for `seconds` and write the counts in collapsed-stack
+    format ("outer;inner count" per line), readable by flamegraph.pl and speedscope.
+    Samples can only be taken when the interpreter switches threads, which never happens
+    inside one big-number operation, so this shows which functions and phases a worker is
+    in but cannot split time between the statements of an LL iteration; see time_engine_steps.
+    """
+    counts = Counter()
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            line = frame.f_lineno
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}" + (f":{line}" if line else ""))
+            frame = frame.f_back
+        counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+    logging.info(f"Wrote {sum(counts.values())} stack samples to {path}")
+    return counts
+
+def time_engine_steps(engine, exponent, budget=STEP_PROFILE_BUDGET, iterations=None):
+    """
+    Split the cost of an LL iteration between squaring and reduction by timing each step of
+    the engine's loop body (ENGINE_STEPS) separately. The first ~log2(p) iterations work on
+    small numbers and are run untimed; timing stops after `iterations` or `budget` seconds.
+    """
+    from mersenne_client_CPU import ENGINE_STEPS
+
+    square, reduce, integer = ENGINE_STEPS[engine]
+    mersenne = (integer(1) << exponent) - 1
+    s = integer(4)
+    warmup = min(exponent.bit_length() + 2, exponent - 2)
+    for _ in range(warmup):
+        s = reduce(square(s), exponent, mersenne)
+
+    limit = exponent - 2 - warmup if iterations is None else iterations
+    square_time = reduce_time = 0.0
+    done = 0
+    deadline = time.perf_counter() + budget
+    while done < limit and time.perf_counter() < deadline:
+        start = time.perf_counter()
+        s = square(s)
+        middle = time.perf_counter()
+        s = reduce(s, exponent, mersenne)
+        square_time += middle - start
+        reduce_time += time.perf_counter() - middle
+        done += 1
+    total = square_time + reduce_time
+    return {
+        'engine': engine,
+        'exponent': exponent,
+        'iterations': done,
+        'square_seconds_per_iteration': square_time / done if done else None,
+        'reduce_seconds_per_iteration': reduce_time / done if done else None,
+        'square_fraction': round(square_time / total, 3) if total else None,
+    }
+
+def profile_current_steps(core_id, shared_state, path):
+    """Write the square/reduce split for the engine and exponent the core is working on"""
+    from mersenne_client_CPU import DEFAULT_ENGINE
+    from mersenne_autotune import select_engine
+
+    task = shared_state['current_tasks'].get(core_id)
+    if not task:
+        logging.info(f"Core {core_id} is idle, skipping the square/reduce breakdown")
+        return None
+    engine = select_engine(shared_state['tuning'], task['exponent'], DEFAULT_ENGINE)
+    steps = time_engine_steps(engine, task['exponent'])
+    with open(path, 'w') as f:
+        json.dump(steps, f, indent=2)
+    logging.info(f"Wrote square/reduce breakdown for M{task['exponent']} ({engine}) to {path}")
+    return steps
+
+def run_profile_request(thread_id, core_id, shared_state):
+    """Sampler thread body; picks up the window requested through shared state, if any"""
+    try:
+        request = shared_state['profile_request']
+    except Exception:
+        request = None
+    if not request or request.get('core_id') != core_id:
+        request = {'seconds': PROFILE_WINDOW, 'interval': PROFILE_INTERVAL, 'path': profile_report_path(core_id)}
+    logging.info(f"Profiling core {core_id} for {request['seconds']}s")
+    sample_stacks(thread_id, request['seconds'], request['interval'], request['path'])
+    try:
+        profile_current_steps(core_id, shared_state, step_report_path(request['path']))
+    except Exception as e:
+        logging.warning(f"Could not measure the square/reduce breakdown on core {core_id}: {e}")
+
+def install_profile_handler(core_id, shared_state):
+    """
+    Let PROFILE_SIGNAL start a sampler thread in this worker. Nothing runs until the
+    signal arrives, so profiling costs nothing while it is not in use.
+    """
+    if not profiling_supported():
+        return
+    thread_id = threading.get_ident()
+
+    def handle_signal(signum, frame):
+        # Manager IPC is not reentrant, so the request is read from the sampler thread
+        threading.Thread(
+            target=run_profile_request,
+            args=(thread_id, core_id, shared_state),
+            daemon=True
+        ).start()
+
+    signal.signal(PROFILE_SIGNAL, handle_signal)
+
+def trigger_profile(shared_state, core_id, seconds=PROFILE_WINDOW, interval=PROFILE_INTERVAL):
+    """Ask the worker on `core_id` to sample itself; returns the report path"""
+    if not profiling_supported():
+        raise RuntimeError("On-demand profiling needs SIGUSR1, which this platform does not provide")
+    pid = shared_state['worker_pids'].get(core_id)
+    if pid is None:
+        raise ValueError(f"No worker running on core {core_id}")
+    path = profile_report_path(core_id)
+    shared_state['profile_request'] = {'core_id': core_id, 'seconds': seconds, 'interval': interval, 'path': path}
+    os.kill(pid, PROFILE_SIGNAL)
+    return path
+
+def main(argv=None):
+    """Print the square/reduce split of an LL iteration for one engine and exponent"""
+    from mersenne_client_CPU import ENGINE_STEPS
+
+    parser = argparse.ArgumentParser(description="Time the squaring and reduction steps of an LL engine.")
+    parser.add_argument('--engine', choices=sorted(ENGINE_STEPS), default="gmpy2-mersenne")
+    parser.add_argument('--exponent', type=int, default=332203)
+    parser.add_argument('--budget', type=float, default=STEP_PROFILE_BUDGET, help="seconds of timed iterations")
+    args = parser.parse_args(argv)
+
+    print(json.dumps(time_engine_steps(args.engine, args.exponent, args.budget), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
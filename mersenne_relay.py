@@ -0,0 +1,368 @@
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+
+import requests
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+from mersenne_client_CPU import create_session
+from mersenne_logging import setup_logging
+
+DEFAULT_UPSTREAM_URL = "http://workserverm1.curecoin.net:5005"
+
+# Local state: buffered tasks and results waiting to be forwarded
+RELAY_FILE = "mersenne_relay.db"
+
+DEFAULT_RELAY_CONFIG = {
+    'buffer_size': 32,           # tasks kept on hand for the fleet
+    'batch_size': 20,            # results forwarded per upstream cycle
+    'lease_timeout': 48 * 3600,  # seconds before an unanswered task is handed out again
+    'wait_timeout': 10,          # seconds a node waits for a task before getting a 503
+    'poll_interval': 2,          # seconds between upstream cycles
+    'max_backoff': 300,          # seconds, cap on the upstream retry delay
+    'max_attempts': 10,          # server errors before a result is moved to dead_results
+    'stats_ttl': 60,             # seconds /public_stats is cached
+}
+
+# Responses meaning upstream as a whole is down; they never count against a result
+UNAVAILABLE_STATUSES = {502, 503, 504}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    leased_at REAL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    result TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS dead_results (
+    id INTEGER PRIMARY KEY,
+    result TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    failed_at REAL NOT NULL
+);
+"""
+
+def describe_result(result):
+    """Short label for a queued result; a prime's result carries every digit of 2^p - 1"""
+    try:
+        result = json.loads(result)
+        return f"for task {result.get('task_id')} (M{result.get('exponent')})"
+    except (ValueError, AttributeError):
+        return "(unreadable)"
+
+class TaskRelay:
+    """
+    Serves the work server API to a LAN of clients from a local buffer.
+    A background thread keeps the buffer filled from upstream and forwards queued
+    results in batches; nodes keep getting work and submitting during upstream outages.
+    """
+    def __init__(self, upstream_url=DEFAULT_UPSTREAM_URL, user_id="relay", path=RELAY_FILE,
+                 host='127.0.0.1', port=5005, **config):
+        self.upstream_url = upstream_url
+        self.user_id = user_id
+        self.config = dict(DEFAULT_RELAY_CONFIG)
+        self.config.update(config)
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.task_available = threading.Condition(self.lock)
+
+        self.session = create_session()
+        self.running = False
+        self.upstream_ok = True
+        self.upstream_errors = 0
+        self.last_upstream_error = None
+        self.stats_cache = None
+        self.stats_cached_at = 0
+        self.worker = None
+
+        self.app = self.create_app()
+        self.server = make_server(host, port, self.app, threaded=True)
+        self.host = host
+        self.port = self.server.server_port
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    # Local buffer
+
+    def buffered_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM tasks WHERE leased_at IS NULL").fetchone()[0]
+
+    def pending_results(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def dead_results(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM dead_results").fetchone()[0]
+
+    def lease_task(self, wait_timeout=0):
+        """Hand out a buffered task, waiting up to `wait_timeout` seconds for the buffer to refill"""
+        deadline = time.time() + wait_timeout
+        with self.task_available:
+            while True:
+                expired = time.time() - self.config['lease_timeout']
+                row = self.conn.execute(
+                    "SELECT task_id, task FROM tasks WHERE leased_at IS NULL OR leased_at < ? "
+                    "ORDER BY fetched_at LIMIT 1",
+                    (expired,)
+                ).fetchone()
+                if row:
+                    with self.conn:
+                        self.conn.execute("UPDATE tasks SET leased_at = ? WHERE task_id = ?", (time.time(), row[0]))
+                    return json.loads(row[1])
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.task_available.wait(remaining)
+
+    def queue_result(self, result):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO results (result, received_at) VALUES (?, ?)",
+                (json.dumps(result), time.time())
+            )
+            self.conn.execute("DELETE FROM tasks WHERE task_id = ?", (str(result.get('task_id')),))
+
+    # Upstream
+
+    def fill_buffer(self):
+        """Fetch tasks from upstream until the buffer is full or upstream runs dry"""
+        while self.running and self.buffered_count() < self.config['buffer_size']:
+            response = self.session.get(
+                f"{self.upstream_url}/get_mersenne_task",
+                params={"user_id": self.user_id, "gpu_available": True},
+                timeout=30
+            )
+            response.raise_for_status()
+            task = response.json()
+            if not task:
+                break
+            with self.task_available, self.conn:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO tasks (task_id, task, fetched_at) VALUES (?, ?, ?)",
+                    (str(task['task_id']), json.dumps(task), time.time())
+                )
+                self.task_available.notify()
+
+    def forward_results(self):
+        """
+        Forward up to one batch of queued results over one keep-alive session.
+        Results that keep failing sort behind newer ones, so one bad result cannot hold up the
+        queue; a rejection (4xx) or max_attempts server errors moves it to dead_results.
+        Raises if upstream is unreachable or unavailable, or if every result in the batch failed.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, result, attempts FROM results ORDER BY attempts, id LIMIT ?",
+                (self.config['batch_size'],)
+            ).fetchall()
+        forwarded = 0
+        last_error = None
+        for result_id, result, attempts in rows:
+            try:
+                response = self.session.post(
+                    f"{self.upstream_url}/submit_mersenne_result",
+                    data=result,
+                    headers={'Content-Type': 'application/json'},
+                    timeout=30
+                )
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                # Upstream is down rather than failing on this result: stop without charging an attempt
+                if status in UNAVAILABLE_STATUSES:
+                    raise
+                # A 4xx means upstream rejected this result; retrying will not help
+                if status is not None and 400 <= status < 500:
+                    logging.error(f"Upstream rejected result {describe_result(result)}: {e}")
+                    self.dead_letter(result_id, e)
+                elif attempts + 1 >= self.config['max_attempts']:
+                    logging.error(f"Giving up on result {describe_result(result)} after {attempts + 1} attempts: {e}")
+                    self.dead_letter(result_id, e)
+                else:
+                    with self.lock, self.conn:
+                        self.conn.execute("UPDATE results SET attempts = attempts + 1 WHERE id = ?", (result_id,))
+                last_error = e
+                continue
+            with self.lock, self.conn:
+                self.conn.execute("DELETE FROM results WHERE id = ?", (result_id,))
+            forwarded += 1
+        if last_error is not None and forwarded == 0:
+            raise last_error
+        return forwarded
+
+    def dead_letter(self, result_id, error):
+        """Move a result that cannot be delivered out of the forwarding queue"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO dead_results (id, result, received_at, attempts, error, failed_at) "
+                "SELECT id, result, received_at, attempts + 1, ?, ? FROM results WHERE id = ?",
+                (str(error), time.time(), result_id)
+            )
+            self.conn.execute("DELETE FROM results WHERE id = ?", (result_id,))
+
+    def upstream_loop(self):
+        """
+        Background thread: forward results and refill the buffer. Each direction backs off
+        on its own, so failing submissions never stop the fleet from getting new tasks.
+        """
+        failures = {'forward': 0, 'fetch': 0}
+        retry_at = {'forward': 0, 'fetch': 0}
+        while self.running:
+            forwarded = 0
+            for direction, action in (('forward', self.forward_results), ('fetch', self.fill_buffer)):
+                if time.time() < retry_at[direction]:
+                    continue
+                try:
+                    if direction == 'forward':
+                        forwarded = action()
+                    else:
+                        action()
+                    failures[direction] = 0
+                except Exception as e:
+                    failures[direction] += 1
+                    retry_at[direction] = time.time() + min(
+                        self.config['poll_interval'] * 2 ** failures[direction], self.config['max_backoff']
+                    )
+                    self.last_upstream_error = str(e)
+                    what = "forwarding results" if direction == 'forward' else "fetching tasks"
+                    logging.error(f"Upstream error while {what}, serving from buffer: {e}")
+
+            upstream_ok = not any(failures.values())
+            if upstream_ok and not self.upstream_ok:
+                logging.info("Upstream work server reachable again")
+                self.last_upstream_error = None
+            self.upstream_ok = upstream_ok
+            self.upstream_errors = max(failures.values())
+
+            # Keep draining without waiting while a backlog remains
+            delay = 0 if forwarded == self.config['batch_size'] else self.config['poll_interval']
+            deadline = time.time() + delay
+            while self.running and time.time() < deadline:
+                time.sleep(min(0.5, deadline - time.time()))
+
+    def public_stats(self):
+        """Upstream /public_stats, cached; the last good copy is served during outages"""
+        if self.stats_cache is None or time.time() - self.stats_cached_at >= self.config['stats_ttl']:
+            try:
+                response = self.session.get(f"{self.upstream_url}/public_stats", timeout=10)
+                response.raise_for_status()
+                self.stats_cache = response.json()
+                self.stats_cached_at = time.time()
+            except Exception as e:
+                logging.warning(f"Could not refresh public stats: {e}")
+        return self.stats_cache
+
+    def status(self):
+        return {
+            'upstream_url': self.upstream_url,
+            'upstream_ok': self.upstream_ok,
+            'upstream_errors': self.upstream_errors,
+            'last_upstream_error': self.last_upstream_error,
+            'buffered_tasks': self.buffered_count(),
+            'pending_results': self.pending_results(),
+            'dead_results': self.dead_results(),
+        }
+
+    def create_app(self):
+        app = Flask(__name__)
+
+        @app.route('/get_mersenne_task')
+        def get_mersenne_task():
+            task = self.lease_task(self.config['wait_timeout'])
+            if task is None:
+                # A 503 makes clients back off instead of polling an empty relay
+                return jsonify({"error": "No tasks buffered"}), 503
+            return jsonify(task)
+
+        @app.route('/submit_mersenne_result', methods=['POST'])
+        def submit_mersenne_result():
+            result = request.get_json(silent=True)
+            if not result or 'task_id' not in result:
+                return jsonify({"error": "Invalid result"}), 400
+            self.queue_result(result)
+            return jsonify({"status": "queued"})
+
+        @app.route('/public_stats')
+        def public_stats():
+            stats = self.public_stats()
+            if stats is None:
+                return jsonify({"error": "Upstream stats unavailable"}), 503
+            return jsonify(stats)
+
+        @app.route('/relay_status')
+        def relay_status():
+            return jsonify(self.status())
+
+        return app
+
+    def start(self):
+        """Start the upstream thread and serve in a background thread"""
+        self.running = True
+        self.worker = threading.Thread(target=self.upstream_loop, daemon=True)
+        self.worker.start()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logging.info(f"Relay listening on {self.url}, upstream {self.upstream_url}")
+        return self
+
+    def stop(self):
+        self.running = False
+        self.server.shutdown()
+        if self.thread:
+            self.thread.join()
+        if self.worker:
+            self.worker.join()
+        self.conn.close()
+
+def main(argv=None):
+    """Run a relay for the local network in the foreground"""
+    parser = argparse.ArgumentParser(description="Relay work server traffic for a fleet of clients.")
+    parser.add_argument('--upstream', default=DEFAULT_UPSTREAM_URL, help=f"work server URL (default {DEFAULT_UPSTREAM_URL})")
+    parser.add_argument('--username', default="relay", help="user id for upstream task requests")
+    parser.add_argument('--host', default='0.0.0.0', help="interface to listen on (default all)")
+    parser.add_argument('--port', type=int, default=5005)
+    parser.add_argument('--db', default=RELAY_FILE, help=f"relay state database (default {RELAY_FILE})")
+    parser.add_argument('--buffer', type=int, default=DEFAULT_RELAY_CONFIG['buffer_size'], help="tasks to keep buffered")
+    parser.add_argument('--batch', type=int, default=DEFAULT_RELAY_CONFIG['batch_size'], help="results forwarded per cycle")
+    parser.add_argument('--log-file', help="also write logs to this file")
+    args = parser.parse_args(argv)
+
+    setup_logging(log_files=[(args.log_file, logging.INFO)] if args.log_file else [])
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    relay = TaskRelay(
+        args.upstream, args.username, args.db, args.host, args.port,
+        buffer_size=args.buffer, batch_size=args.batch
+    ).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logging.info("Stopping relay")
+        relay.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import argparse
+import logging
+import sys
+import time
+
+# Mersenne prime exponents: the final LL residue must be exactly zero
+KNOWN_PRIME_EXPONENTS = [3, 5, 7, 13, 17, 19, 31, 61, 89, 107, 127, 521, 607, 1279, 2203, 2281, 3217, 4253, 4423]
+
+# Prime exponents with composite 2^p - 1 and the low 64 bits of s(p-2) mod 2^p - 1
+KNOWN_COMPOSITE_RESIDUES = {
+    11: "00000000000006C8",
+    23: "00000000005D32F7",
+    29: "000000001B57CB0B",
+    37: "0000001B435853C0",
+    41: "000000C771A34E19",
+    43: "000005407522FC59",
+    47: "000057F28CACB060",
+    53: "0014A4AA2AF1C57D",
+    59: "064099E5FCBCAF36",
+    67: "677D24EE8AE3B2C2",
+    71: "BB737B29D59E0C94",
+    73: "779075A783EDAD63",
+    79: "A607B2841FCFB77A",
+    83: "9554413A9271C592",
+    97: "F5DE17C663A867FB",
+    101: "D0DD748DD7817436",
+    103: "55099688AA375B3E",
+    109: "288BE38A641F9F62",
+    113: "780EA2B2E6916CF9",
+    131: "CE3C8D1BF6DF73B7",
+    1283: "B1B97600F4C17A1A",
+    2207: "63568B25888D993A",
+    2287: "74397411A2961A3A",
+    3221: "876ED523172BFD64",
+    4259: "175779CBBE4B4C07",
+    4441: "9F1F41F723BD1D5F",
+}
+
+# Time allowed for the self-test the client runs before accepting work
+STARTUP_SELF_TEST_BUDGET = 5  # seconds
+
+def self_test_cases():
+    """All (exponent, expected res64) cases, smallest first so a budget covers the cheap ones"""
+    cases = {p: "0000000000000000" for p in KNOWN_PRIME_EXPONENTS}
+    cases.update(KNOWN_COMPOSITE_RESIDUES)
+    return sorted(cases.items())
+
+def run_engine_self_test(name, engine, budget=None):
+    """
+    Run one engine against the known results until they are exhausted or the budget runs out.
+    The first case always runs so every engine is exercised at least once. Every other case
+    starts from a shifted seed to cover the double-check path.
+    """
+    # Imported here to avoid a circular import with the client module
+    from mersenne_client_CPU import residue64
+
+    report = {'engine': name, 'cases': 0, 'failures': [], 'seconds': 0.0, 'iterations': 0}
+    start = time.time()
+    for index, (exponent, expected) in enumerate(self_test_cases()):
+        if budget is not None and report['cases'] and time.time() - start >= budget:
+            break
+        shift = exponent // 2 if index % 2 else 0
+        try:
+            got = residue64(engine(exponent, shift))
+        except Exception as e:
+            got = f"error: {e}"
+        report['cases'] += 1
+        report['iterations'] += exponent - 2
+        if got != expected:
+            report['failures'].append({'exponent': exponent, 'shift': shift, 'expected': expected, 'got': got})
+    report['seconds'] = time.time() - start
+    report['passed'] = not report['failures']
+    return report
+
+def run_self_test(engines, budget=None):
+    """Self-test every engine, splitting the budget evenly; returns {engine name: report}"""
+    per_engine = budget / len(engines) if budget is not None else None
+    return {name: run_engine_self_test(name, engine, per_engine) for name, engine in engines.items()}
+
+def format_report(reports):
+    lines = []
+    for report in reports.values():
+        status = "PASS" if report['passed'] else "FAIL"
+        rate = report['iterations'] / report['seconds'] if report['seconds'] > 0 else 0
+        lines.append(
+            f"{report['engine']:<16} {status}  {report['cases']} cases in {report['seconds']:.2f}s "
+            f"({rate:,.0f} iterations/s)"
+        )
+        for failure in report['failures']:
+            lines.append(
+                f"    M{failure['exponent']} (shift {failure['shift']}): "
+                f"expected {failure['expected']}, got {failure['got']}"
+            )
+    return "\n".join(lines)
+
+def main(argv=None):
+    """Offline self-test of the LL engines against known Mersenne results"""
+    from mersenne_client_CPU import ENGINES
+
+    parser = argparse.ArgumentParser(description="Check LL engines against known Mersenne results.")
+    parser.add_argument('--engine', action='append', choices=sorted(ENGINES),
+                        help="engine to test; may be repeated (default: all)")
+    parser.add_argument('--budget', type=float, help="total time budget in seconds (default: run every case)")
+    args = parser.parse_args(argv)
+
+    engines = {name: ENGINES[name] for name in (args.engine or ENGINES)}
+    reports = run_self_test(engines, args.budget)
+    print(format_report(reports))
+    return 0 if all(report['passed'] for report in reports.values()) else 1
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import sqlite3
+import time
+import logging
+
+# Default location of the persistent throughput history
+STATS_FILE = "mersenne_stats.db"
+
+# Bucket widths of the stored series; each event is added to one row per resolution
+RESOLUTIONS = {
+    'minute': 60,
+    'hour': 3600,
+}
+
+# Minute buckets older than this are dropped, the hourly series is kept indefinitely
+MINUTE_RETENTION = 7 * 24 * 3600  # seconds
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series_{name} (
+    bucket INTEGER NOT NULL,
+    core_id INTEGER NOT NULL,
+    tasks INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    duration_sum REAL NOT NULL DEFAULT 0,
+    duration_max REAL NOT NULL DEFAULT 0,
+    resubmitted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, core_id)
+);
+"""
+
+# Columns added after the first release, created on stores that predate them
+MIGRATIONS = [("resubmitted", "INTEGER NOT NULL DEFAULT 0")]
+
+def effective_step(step):
+    """Bucket width query() uses for a requested step: never finer than the minute resolution"""
+    return max(int(step), RESOLUTIONS['minute'])
+
+class StatsStore:
+    """
+    Downsampled time series of per-core task counts, durations and errors.
+    Events are folded into fixed-width buckets as they arrive, so the history
+    grows with elapsed time rather than with the number of tasks.
+    """
+    def __init__(self, path=STATS_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        for name in RESOLUTIONS:
+            self.conn.executescript(SCHEMA.format(name=name))
+        self.conn.commit()
+        self.migrate()
+        self.last_prune = 0
+
+    def missing_columns(self):
+        missing = []
+        for name in RESOLUTIONS:
+            existing = {row['name'] for row in self.conn.execute(f"PRAGMA table_info(series_{name})")}
+            missing.extend((name, column, kind) for column, kind in MIGRATIONS if column not in existing)
+        return missing
+
+    def migrate(self):
+        """Add columns missing from older stores, taking the write lock only when there are some"""
+        if not self.missing_columns():
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for name, column, kind in self.missing_columns():
+                self.conn.execute(f"ALTER TABLE series_{name} ADD COLUMN {column} {kind}")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def _add(self, core_id, timestamp, tasks=0, errors=0, duration=0.0, resubmitted=0):
+        timestamp = timestamp or time.time()
+        with self.conn:
+            for name, width in RESOLUTIONS.items():
+                bucket = int(timestamp // width * width)
+                self.conn.execute(
+                    f"INSERT INTO series_{name} (bucket, core_id, tasks, errors, duration_sum, duration_max, resubmitted) "
+                    f"VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    f"ON CONFLICT (bucket, core_id) DO UPDATE SET "
+                    f"tasks = tasks + excluded.tasks, errors = errors + excluded.errors, "
+                    f"duration_sum = duration_sum + excluded.duration_sum, "
+                    f"duration_max = MAX(duration_max, excluded.duration_max), "
+                    f"resubmitted = resubmitted + excluded.resubmitted",
+                    (bucket, core_id, tasks, errors, duration, duration, resubmitted)
+                )
+            if timestamp - self.last_prune > 3600:
+                self.conn.execute("DELETE FROM series_minute WHERE bucket < ?", (timestamp - MINUTE_RETENTION,))
+                self.last_prune = timestamp
+
+    def record_task(self, core_id, duration, timestamp=None):
+        """
+        Count a completed task and its duration in seconds. A duration of None marks a result
+        resubmitted from the ledger: it counts as a task but not towards the durations.
+        """
+        if duration is None:
+            self._add(core_id, timestamp, tasks=1, resubmitted=1)
+        else:
+            self._add(core_id, timestamp, tasks=1, duration=duration)
+
+    def record_error(self, core_id, timestamp=None):
+        self._add(core_id, timestamp, errors=1)
+
+    def query(self, start, end, step=60, per_core=False):
+        """
+        Aggregate [start, end) into buckets of `step` seconds, using the coarsest stored
+        resolution that fits so only the requested rows are read.
+        """
+        step = effective_step(step)
+        name = 'hour' if step % RESOLUTIONS['hour'] == 0 else 'minute'
+        group = "core_id, " if per_core else ""
+        rows = self.conn.execute(
+            f"SELECT (bucket / ?) * ? AS time, {group}"
+            f"SUM(tasks) AS tasks, SUM(errors) AS errors, "
+            f"SUM(duration_sum) AS duration_sum, MAX(duration_max) AS max_duration, "
+            f"SUM(resubmitted) AS resubmitted "
+            f"FROM series_{name} WHERE bucket >= ? AND bucket < ? "
+            f"GROUP BY time{', core_id' if per_core else ''} ORDER BY time",
+            (step, step, int(start), int(end))
+        )
+        series = []
+        for row in rows:
+            point = dict(row)
+            duration_sum = point.pop('duration_sum')
+            # Averages cover computed tasks only; resubmissions took no LL work
+            computed = point['tasks'] - point['resubmitted']
+            point['avg_duration'] = round(duration_sum / computed, 3) if computed else None
+            if not computed:
+                point['max_duration'] = None
+            point['tasks_per_hour'] = round(point['tasks'] * 3600 / step, 2)
+            series.append(point)
+        return series
+
+    def total_tasks(self):
+        row = self.conn.execute("SELECT COALESCE(SUM(tasks), 0) AS tasks FROM series_hour").fetchone()
+        return row['tasks']
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception as e:
+            logging.warning(f"Error closing stats store {self.path}: {e}")
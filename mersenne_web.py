@@ -6,15 +6,15 @@ import time
 from datetime import datetime
 import multiprocessing
 from mersenne_client_CPU import MersenneCPUClient
+from mersenne_stats_store import StatsStore, STATS_FILE, effective_step
+from mersenne_ledger import ExponentLedger, LEDGER_FILE
+from mersenne_profiler import list_profile_reports, profiling_supported, PROFILE_WINDOW
+from mersenne_logging import setup_logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("mersenne_web.log"),
-        logging.StreamHandler()
-    ]
+# Configure logging: records are queued to one background writer with rotation
+log_pipeline = setup_logging(
+    log_files=[("mersenne_web.log", logging.INFO)],
+    level=logging.INFO
 )
 
 # Suppress Flask request logging
@@ -35,6 +35,8 @@ os.makedirs('mersenne_static', exist_ok=True)
 
 # Global configuration
 CONFIG_FILE = "mersenne_config.json"
+# Completed-task totals reach the config file at most this often; stopping writes them at once
+CONFIG_SAVE_INTERVAL = 60  # seconds
 CLIENT_CONFIG = {
     'username': None,
     'is_running': False,
@@ -42,7 +44,11 @@ CLIENT_CONFIG = {
     'current_task': None,
     'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
     'cores_to_use': multiprocessing.cpu_count(),
-    'client': None
+    'client': None,
+    'tasks_synced': 0,
+    'tasks_unsaved': False,
+    'tasks_saved_at': 0,
+    'server_url': os.environ.get('MERSENNE_SERVER_URL', "http://workserverm1.curecoin.net:5005")
 }
 
 def load_config():
@@ -65,6 +71,23 @@ def save_config():
         }
         json.dump(config_to_save, f)
 
+def sync_tasks_completed(force=False):
+    """
+    Add tasks finished by the running client to the persisted total.
+    The config file is rewritten at most every CONFIG_SAVE_INTERVAL seconds unless `force` is set.
+    """
+    client = CLIENT_CONFIG['client']
+    if client and hasattr(client, 'shared_state'):
+        count = client.shared_state['tasks_completed']
+        if count > CLIENT_CONFIG['tasks_synced']:
+            CLIENT_CONFIG['tasks_completed'] += count - CLIENT_CONFIG['tasks_synced']
+            CLIENT_CONFIG['tasks_synced'] = count
+            CLIENT_CONFIG['tasks_unsaved'] = True
+    if CLIENT_CONFIG['tasks_unsaved'] and (force or time.time() - CLIENT_CONFIG['tasks_saved_at'] >= CONFIG_SAVE_INTERVAL):
+        save_config()
+        CLIENT_CONFIG['tasks_unsaved'] = False
+        CLIENT_CONFIG['tasks_saved_at'] = time.time()
+
 @app.route('/', methods=['GET', 'POST'])
 def login():
     """Login page"""
@@ -93,6 +116,8 @@ def dashboard():
 def stats():
     """Return current stats"""
     try:
+        sync_tasks_completed()
+        
         # Get current tasks from client if it exists
         current_tasks = []
         processing_speed = 0
@@ -130,6 +155,90 @@ def stats():
         logging.error(f"Error in stats endpoint: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/stats/history')
+def stats_history():
+    """Return throughput history between start and end (unix seconds) in buckets of step seconds"""
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - 24 * 3600))
+        # The store has no buckets finer than a minute; report the step actually used
+        step = effective_step(request.args.get('step', 3600))
+        per_core = request.args.get('per_core', 'false').lower() == 'true'
+        
+        store = StatsStore(STATS_FILE)
+        try:
+            series = store.query(start, end, step, per_core)
+        finally:
+            store.close()
+        return jsonify({'start': start, 'end': end, 'step': step, 'series': series})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid history range: {e}"}), 400
+    except Exception as e:
+        logging.error(f"Error in stats history endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stats/energy')
+def stats_energy():
+    """Return joules per LL iteration and per exponent by engine and core count, optionally since a unix time"""
+    try:
+        since = float(request.args.get('since', 0))
+        
+        ledger = ExponentLedger(LEDGER_FILE)
+        try:
+            summary = ledger.energy_summary(since)
+        finally:
+            ledger.close()
+        
+        # Energy of the most recent task on each core, when a counter is available
+        last_tasks = {}
+        client = CLIENT_CONFIG['client']
+        if client and hasattr(client, 'shared_state'):
+            last_tasks = {
+                core_id: task['energy']
+                for core_id, task in client.shared_state['last_task'].items()
+                if task and task.get('energy')
+            }
+        return jsonify({'summary': summary, 'last_tasks': last_tasks})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid time: {e}"}), 400
+    except Exception as e:
+        logging.error(f"Error in stats energy endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/profile', methods=['GET', 'POST'])
+def profile():
+    """Start sampling a worker (POST) or list reports and the last task's phase timings (GET)"""
+    try:
+        client = CLIENT_CONFIG['client']
+        if request.method == 'POST':
+            if not client or not CLIENT_CONFIG['is_running']:
+                return jsonify({"error": "Processing is not running"}), 409
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict):
+                return jsonify({"error": "Expected a JSON object with 'core' and 'seconds'"}), 400
+            core_id = int(body.get('core', 0))
+            seconds = float(body.get('seconds', PROFILE_WINDOW))
+            if not 0 < seconds <= 600:
+                return jsonify({"error": "Profile window must be between 0 and 600 seconds"}), 400
+            path = client.request_profile(core_id, seconds)
+            return jsonify({"status": "profiling", "core": core_id, "seconds": seconds, "report": path})
+        
+        last_tasks = {}
+        if client and hasattr(client, 'shared_state'):
+            last_tasks = {core_id: task for core_id, task in client.shared_state['last_task'].items() if task}
+        return jsonify({
+            "supported": profiling_supported(),
+            "reports": list_profile_reports(),
+            "last_tasks": last_tasks
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 501
+    except Exception as e:
+        logging.error(f"Error in profile endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/toggle_processing', methods=['POST'])
 def toggle_processing():
     """Toggle the processing state"""
@@ -140,9 +249,10 @@ def toggle_processing():
             # Initialize client if not exists
             if not CLIENT_CONFIG['client']:
                 CLIENT_CONFIG['client'] = MersenneCPUClient(
-                    server_url="http://workserverm1.curecoin.net:5005",
+                    server_url=CLIENT_CONFIG['server_url'],
                     user_id=CLIENT_CONFIG['username'],
-                    num_cores=CLIENT_CONFIG['cores_to_use']
+                    num_cores=CLIENT_CONFIG['cores_to_use'],
+                    log_pipeline=log_pipeline
                 )
             
             # Start processing
@@ -153,10 +263,12 @@ def toggle_processing():
             # Stop processing
             if CLIENT_CONFIG['client']:
                 CLIENT_CONFIG['client'].shared_state['running'] = False
+                sync_tasks_completed(force=True)
             logging.info("Processing stopped")
             return jsonify({"status": "stopped"})
             
     except Exception as e:
+        CLIENT_CONFIG['is_running'] = False
         logging.error(f"Error toggling processing: {e}")
         return jsonify({"error": str(e)}), 500
 
@@ -190,7 +302,12 @@ def main():
         print("================================\n")
         
         # Start the Flask app
-        app.run(host='127.0.0.1', port=5002, debug=False)
+        try:
+            app.run(host='127.0.0.1', port=5002, debug=False)
+        finally:
+            # The client may already be gone, so only write what /stats has synced
+            if CLIENT_CONFIG['tasks_unsaved']:
+                save_config()
         
     except Exception as e:
         logging.error(f"Error running web interface: {e}")
@@ -8,32 +8,24 @@ import multiprocessing
 import requests
 import traceback
 from mersenne_client_CPU import MersenneCPUClient
+from mersenne_stats_store import StatsStore, STATS_FILE, effective_step
+from mersenne_ledger import ExponentLedger, LEDGER_FILE
+from mersenne_profiler import list_profile_reports, profiling_supported, PROFILE_WINDOW
+from mersenne_logging import setup_logging
 
-# Configure logging with both file and console handlers
-log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s')
-
-# Create file handler for web interface specific logs
-file_handler = logging.FileHandler("mersenne_web_interface.log")
-file_handler.setFormatter(log_formatter)
-file_handler.setLevel(logging.DEBUG)
-
-# Create console handler
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(log_formatter)
-console_handler.setLevel(logging.INFO)
-
-# Configure root logger
-logging.basicConfig(
-    level=logging.DEBUG,
-    handlers=[file_handler, console_handler]
+# Configure logging: records are queued to one background writer with rotation,
+# so request threads never wait on disk I/O. Set MERSENNE_LOG_LEVEL=DEBUG for verbose logs.
+log_pipeline = setup_logging(
+    log_files=[
+        ("mersenne_web_interface.log", logging.DEBUG),
+        ("mersenne_web_network.log", logging.DEBUG, 'network')
+    ],
+    level=os.environ.get('MERSENNE_LOG_LEVEL', 'INFO').upper(),
+    fmt='%(asctime)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
 )
 
-# Create separate logger for network operations
+# Separate logger for network operations, also written to its own file
 network_logger = logging.getLogger('network')
-network_handler = logging.FileHandler("mersenne_web_network.log")
-network_handler.setFormatter(log_formatter)
-network_logger.addHandler(network_handler)
-network_logger.setLevel(logging.DEBUG)
 
 # Suppress Flask request logging but keep errors
 logging.getLogger('werkzeug').setLevel(logging.ERROR)
@@ -53,6 +45,8 @@ os.makedirs('mersenne_static', exist_ok=True)
 
 # Global configuration
 CONFIG_FILE = "mersenne_config.json"
+# Completed-task totals reach the config file at most this often; stopping writes them at once
+CONFIG_SAVE_INTERVAL = 60  # seconds
 CLIENT_CONFIG = {
     'username': None,
     'is_running': False,
@@ -61,7 +55,10 @@ CLIENT_CONFIG = {
     'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
     'cores_to_use': multiprocessing.cpu_count(),
     'client': None,
-    'server_url': "http://workserverm1.curecoin.net:5005",
+    'tasks_synced': 0,
+    'tasks_unsaved': False,
+    'tasks_saved_at': 0,
+    'server_url': os.environ.get('MERSENNE_SERVER_URL', "http://workserverm1.curecoin.net:5005"),
     'connection_status': 'disconnected',
     'last_error': None,
     'error_count': 0
@@ -152,6 +149,23 @@ def validate_username(username):
         return False, "Username can only contain letters, numbers, and underscores"
     return True, "Valid username"
 
+def sync_tasks_completed(force=False):
+    """
+    Add tasks finished by the running client to the persisted total.
+    The config file is rewritten at most every CONFIG_SAVE_INTERVAL seconds unless `force` is set.
+    """
+    client = CLIENT_CONFIG['client']
+    if client and hasattr(client, 'shared_state'):
+        count = client.shared_state['tasks_completed']
+        if count > CLIENT_CONFIG['tasks_synced']:
+            CLIENT_CONFIG['tasks_completed'] += count - CLIENT_CONFIG['tasks_synced']
+            CLIENT_CONFIG['tasks_synced'] = count
+            CLIENT_CONFIG['tasks_unsaved'] = True
+    if CLIENT_CONFIG['tasks_unsaved'] and (force or time.time() - CLIENT_CONFIG['tasks_saved_at'] >= CONFIG_SAVE_INTERVAL):
+        save_config()
+        CLIENT_CONFIG['tasks_unsaved'] = False
+        CLIENT_CONFIG['tasks_saved_at'] = time.time()
+
 @app.route('/', methods=['GET', 'POST'])
 def login():
     """Login page with enhanced validation and logging"""
@@ -204,7 +218,7 @@ def dashboard():
 def stats():
     """Return current stats with enhanced error handling"""
     try:
-        logging.debug("Stats endpoint accessed")
+        sync_tasks_completed()
         
         # Get current tasks from client if it exists
         current_tasks = []
@@ -229,8 +243,6 @@ def stats():
                 minutes = int((elapsed_time % 3600) // 60)
                 seconds = int(elapsed_time % 60)
                 running_time = f"{hours}h {minutes}m {seconds}s"
-                
-                logging.debug(f"Client stats: {tasks_completed} tasks, {processing_speed:.2f} tasks/hour")
             except Exception as e:
                 logging.error(f"Error accessing client shared state: {e}")
         
@@ -246,8 +258,6 @@ def stats():
             'last_error': CLIENT_CONFIG['last_error'],
             'error_count': CLIENT_CONFIG['error_count']
         }
-        
-        logging.debug(f"Returning stats: {stats_data}")
         return jsonify(stats_data)
         
     except Exception as e:
@@ -255,6 +265,93 @@ def stats():
         logging.error(f"Full traceback: {traceback.format_exc()}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/stats/history')
+def stats_history():
+    """Return throughput history between start and end (unix seconds) in buckets of step seconds"""
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - 24 * 3600))
+        # The store has no buckets finer than a minute; report the step actually used
+        step = effective_step(request.args.get('step', 3600))
+        per_core = request.args.get('per_core', 'false').lower() == 'true'
+        
+        store = StatsStore(STATS_FILE)
+        try:
+            series = store.query(start, end, step, per_core)
+        finally:
+            store.close()
+        return jsonify({'start': start, 'end': end, 'step': step, 'series': series})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid history range: {e}"}), 400
+    except Exception as e:
+        logging.error(f"Error in stats history endpoint: {e}")
+        logging.error(f"Full traceback: {traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stats/energy')
+def stats_energy():
+    """Return joules per LL iteration and per exponent by engine and core count, optionally since a unix time"""
+    try:
+        since = float(request.args.get('since', 0))
+        
+        ledger = ExponentLedger(LEDGER_FILE)
+        try:
+            summary = ledger.energy_summary(since)
+        finally:
+            ledger.close()
+        
+        # Energy of the most recent task on each core, when a counter is available
+        last_tasks = {}
+        client = CLIENT_CONFIG['client']
+        if client and hasattr(client, 'shared_state'):
+            last_tasks = {
+                core_id: task['energy']
+                for core_id, task in client.shared_state['last_task'].items()
+                if task and task.get('energy')
+            }
+        return jsonify({'summary': summary, 'last_tasks': last_tasks})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid time: {e}"}), 400
+    except Exception as e:
+        logging.error(f"Error in stats energy endpoint: {e}")
+        logging.error(f"Full traceback: {traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/profile', methods=['GET', 'POST'])
+def profile():
+    """Start sampling a worker (POST) or list reports and the last task's phase timings (GET)"""
+    try:
+        client = CLIENT_CONFIG['client']
+        if request.method == 'POST':
+            if not client or not CLIENT_CONFIG['is_running']:
+                return jsonify({"error": "Processing is not running"}), 409
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict):
+                return jsonify({"error": "Expected a JSON object with 'core' and 'seconds'"}), 400
+            core_id = int(body.get('core', 0))
+            seconds = float(body.get('seconds', PROFILE_WINDOW))
+            if not 0 < seconds <= 600:
+                return jsonify({"error": "Profile window must be between 0 and 600 seconds"}), 400
+            path = client.request_profile(core_id, seconds)
+            return jsonify({"status": "profiling", "core": core_id, "seconds": seconds, "report": path})
+        
+        last_tasks = {}
+        if client and hasattr(client, 'shared_state'):
+            last_tasks = {core_id: task for core_id, task in client.shared_state['last_task'].items() if task}
+        return jsonify({
+            "supported": profiling_supported(),
+            "reports": list_profile_reports(),
+            "last_tasks": last_tasks
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 501
+    except Exception as e:
+        logging.error(f"Error in profile endpoint: {e}")
+        logging.error(f"Full traceback: {traceback.format_exc()}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/toggle_processing', methods=['POST'])
 def toggle_processing():
     """Toggle the processing state with enhanced error handling"""
@@ -279,7 +376,8 @@ def toggle_processing():
                     CLIENT_CONFIG['client'] = MersenneCPUClient(
                         server_url=CLIENT_CONFIG['server_url'],
                         user_id=CLIENT_CONFIG['username'],
-                        num_cores=CLIENT_CONFIG['cores_to_use']
+                        num_cores=CLIENT_CONFIG['cores_to_use'],
+                        log_pipeline=log_pipeline
                     )
                 
                 # Start processing
@@ -300,6 +398,7 @@ def toggle_processing():
                 if CLIENT_CONFIG['client']:
                     logging.info("Stopping Mersenne processing")
                     CLIENT_CONFIG['client'].shared_state['running'] = False
+                    sync_tasks_completed(force=True)
                 logging.info("Processing stopped successfully")
                 return jsonify({"status": "stopped"})
                 
@@ -420,7 +519,12 @@ def main():
         logging.info(f"Initial connection status: {CLIENT_CONFIG['connection_status']}")
         
         # Start the Flask app
-        app.run(host='127.0.0.1', port=5002, debug=False)
+        try:
+            app.run(host='127.0.0.1', port=5002, debug=False)
+        finally:
+            # The client may already be gone, so only write what /stats has synced
+            if CLIENT_CONFIG['tasks_unsaved']:
+                save_config()
         
     except Exception as e:
         logging.error(f"Error running web interface: {e}")